@@ -1,6 +1,19 @@
 #!/bin/sh
-python manage.py migrate
-python manage.py loaddata data/users.json
-python manage.py loaddata data/polls-v4.json
-python manage.py loaddata data/votes-v4.json
-python ./manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+# entrypoint.sh [serve|setup|dev]
+#   serve  run the production server (the default)
+#   setup  apply migrations and load the fixtures, then exit
+#   dev    setup, then run the development server
+set -e
+
+setup() {
+    python manage.py migrate
+    python manage.py load_fixtures data/users.json data/polls-v4.json data/votes-v4.json
+    python manage.py rebuild_vote_counts
+}
+
+case "${1:-serve}" in
+    serve) exec gunicorn -c kupolls/gunicorn.conf.py ;;
+    setup) setup ;;
+    dev) setup; exec python ./manage.py runserver 0.0.0.0:8000 ;;
+    *) echo "Usage: $0 [serve|setup|dev]" >&2; exit 2 ;;
+esac
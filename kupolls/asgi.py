@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kupolls.settings')
 
 application = get_asgi_application()
+
+# compile the templates now rather than during the first requests
+from polls.warmup import warm_up  # noqa: E402
+
+warm_up()
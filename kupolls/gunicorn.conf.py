@@ -0,0 +1,92 @@
+'''
+gunicorn configuration of the production server:
+
+    gunicorn -c kupolls/gunicorn.conf.py
+
+Serves kupolls.wsgi with threaded workers, or kupolls.asgi with uvicorn
+workers when SERVER_INTERFACE (default: asgi if ASYNC_VIEWS) is asgi.
+The application is loaded once in the master and forked, so the workers
+share its memory. SIGHUP re-reads this file and replaces the workers
+gracefully; SIGTERM lets requests in flight finish within
+SERVER_GRACEFUL_TIMEOUT seconds before the workers exit.
+'''
+import os
+import decouple
+from kupolls.server import (cpu_limit, memory_limit, thread_count,
+                            worker_count)
+
+# gunicorn reads every module-level name, and `config` is one of its
+# settings, so decouple is not imported as `from decouple import config`
+env = decouple.config
+
+# the production server never shows debug pages, whatever .env says
+os.environ['DEBUG'] = 'False'
+# the workers would each rotate the same log file and lose records, so
+# they log to standard error, with gunicorn's own log
+os.environ['LOG_FILE'] = '-'
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kupolls.settings')
+
+# WEB_CONCURRENCY, SERVER_THREADS and SERVER_INTERFACE may be left empty
+# in .env for the values derived here
+interface = env('SERVER_INTERFACE', cast=str, default='') or (
+    'asgi' if env('ASYNC_VIEWS', cast=bool, default=False) else 'wsgi')
+if interface not in ('wsgi', 'asgi'):
+    raise ValueError(f'Unknown SERVER_INTERFACE {interface!r}')
+
+cpus = cpu_limit()
+workers = int(env('WEB_CONCURRENCY', cast=str, default='') or worker_count(
+    cpus, memory_limit(),
+    worker_memory=env('SERVER_WORKER_MEMORY_MB', cast=int, default=64)
+    * 2 ** 20,
+    base_memory=env('SERVER_BASE_MEMORY_MB', cast=int, default=64)
+    * 2 ** 20))
+
+if interface == 'asgi':
+    wsgi_app = 'kupolls.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'kupolls.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(env('SERVER_THREADS', cast=str, default='')
+                  or thread_count(cpus, workers))
+
+bind = env('SERVER_BIND', cast=str, default='0.0.0.0:8000')
+preload_app = True
+timeout = env('SERVER_TIMEOUT', cast=int, default=30)
+graceful_timeout = env('SERVER_GRACEFUL_TIMEOUT', cast=int, default=30)
+keepalive = 5
+# replace workers now and then to bound slow memory growth; the jitter
+# keeps them from restarting all at once
+max_requests = env('SERVER_MAX_REQUESTS', cast=int, default=5000)
+max_requests_jitter = max_requests // 10
+# heartbeat files in memory rather than on a possibly slow overlay disk
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+errorlog = '-'
+
+
+def when_ready(server):
+    from django.conf import settings
+    server.log.info('%d %s workers, %s', workers, worker_class,
+                    f'{threads} threads each' if interface == 'wsgi'
+                    else 'async')
+    if workers > 1 and settings.POLLS_CACHE == 'locmem':
+        raise RuntimeError('POLLS_CACHE=locmem keeps a separate cache in '
+                           'each worker: results cached by one worker '
+                           'miss the votes written by the others for up '
+                           'to POLLS_CACHE_TIMEOUT seconds, and with '
+                           'SESSION_STORE=cached_db a session ended in one '
+                           'worker stays valid in the others. Set '
+                           'POLLS_CACHE to file or redis, or '
+                           'WEB_CONCURRENCY to 1.')
+    if workers > 1 and settings.VOTE_INGESTION == 'queued':
+        server.log.warning('VOTE_INGESTION=queued buffers votes in each '
+                           'worker; a voter whose next request reaches '
+                           'another worker does not see their vote until '
+                           'it is flushed, within VOTE_FLUSH_INTERVAL '
+                           'seconds.')
+
+
+def pre_fork(server, worker):
+    # a connection opened while loading the app must not be shared
+    from django.db import connections
+    connections.close_all()
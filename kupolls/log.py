@@ -0,0 +1,145 @@
+'''
+Logging that keeps file writes off the request threads.
+
+QueuedFileHandler puts records on a bounded queue, and a QueueListener
+thread writes them as JSON lines to a size-rotated file, or to standard
+error when the file is '-'. Rotation is not safe when several processes
+write the same file, so the production server logs to standard error,
+which they can share. When the queue is full, because the disk is slow,
+records are dropped (policy 'drop') or the logging thread waits up to
+`timeout` seconds for room before dropping them (policy 'block'). The
+number dropped is logged once there is room again.
+'''
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# attributes every LogRecord has; anything else was passed in `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message',
+                                                             'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    '''Format a record as one line of JSON'''
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.thread,
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        return json.dumps(entry, default=str)
+
+
+class Listener(QueueListener):
+    '''QueueListener that writes out every queued record when stopped'''
+
+    def enqueue_sentinel(self):
+        # wait for room rather than fail when the queue is full
+        self.queue.put(self._sentinel)
+
+
+class QueuedFileHandler(QueueHandler):
+    '''
+    Queue records for a listener thread that writes them to filename,
+    rotating it at max_bytes and keeping backup_count old files, or to
+    standard error if filename is '-'.
+    '''
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 queue_size=10000, policy='drop', timeout=1.0):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f'Unknown log queue policy {policy!r}')
+        super().__init__(queue.Queue(queue_size))
+        if filename == '-':
+            self.target = logging.StreamHandler(sys.stderr)
+        else:
+            self.target = RotatingFileHandler(
+                filename, maxBytes=max_bytes, backupCount=backup_count,
+                encoding='utf-8', delay=True)
+        self.policy = policy
+        self.timeout = timeout
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._start()
+        os.register_at_fork(after_in_child=self._restart)
+        atexit.register(self.close)
+
+    def _start(self):
+        self.listener = Listener(self.queue, self.target,
+                                 respect_handler_level=True)
+        self.listener.start()
+
+    def _restart(self):
+        '''Start a listener in a forked child, where the thread is gone'''
+        self.queue = queue.Queue(self.queue.maxsize)
+        self._dropped_lock = threading.Lock()
+        self._start()
+
+    def setFormatter(self, fmt):
+        # records are formatted by the listener, not on the logging thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        '''
+        Merge the arguments into the message and the traceback into text,
+        so the record no longer refers to objects the thread may change.
+        '''
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.dropped:
+            self._report_dropped()
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def _report_dropped(self):
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        record = logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING,
+            'levelname': 'WARNING',
+            'msg': f'Dropped {dropped} log records, the log queue was full'})
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += dropped
+
+    def close(self):
+        '''Write out the queued records and stop the listener'''
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
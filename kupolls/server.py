@@ -0,0 +1,66 @@
+'''
+Sizing of the production server started with gunicorn.conf.py.
+
+Workers are limited by the CPUs the container may use and by its memory
+limit, so that a small container on a many-core host does not start more
+workers than it can hold. When memory caps the workers, each one runs
+more threads instead.
+'''
+import math
+import os
+
+CGROUP = '/sys/fs/cgroup'
+# cgroup v1 reports "no limit" as a page-aligned number near 2**63
+UNLIMITED = 2 ** 60
+# requests mostly wait on the database, so a CPU keeps this many busy
+THREADS_PER_CPU = 4
+MAX_THREADS = 16
+
+
+def read_cgroup(name, cgroup=CGROUP):
+    '''The stripped contents of a cgroup file, or None if it is missing'''
+    try:
+        with open(os.path.join(cgroup, name)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit(cgroup=CGROUP):
+    '''CPUs this process may run on, capped by the cgroup CPU quota'''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = read_cgroup('cpu.max', cgroup)
+    if quota and not quota.startswith('max'):
+        limit, period = quota.split()
+        cpus = min(cpus, math.ceil(int(limit) / int(period)))
+    return max(1, cpus)
+
+
+def memory_limit(cgroup=CGROUP):
+    '''Bytes of memory the container may use, or None if unlimited'''
+    limit = (read_cgroup('memory.max', cgroup)
+             or read_cgroup('memory/memory.limit_in_bytes', cgroup))
+    if not limit or limit == 'max' or int(limit) >= UNLIMITED:
+        return None
+    return int(limit)
+
+
+def worker_count(cpus, memory=None, worker_memory=64 * 2 ** 20,
+                 base_memory=64 * 2 ** 20):
+    '''
+    2 * cpus + 1 workers, or fewer if memory bytes cannot hold that many
+    workers of worker_memory bytes beside a master of base_memory bytes.
+    '''
+    workers = 2 * cpus + 1
+    if memory is not None:
+        workers = min(workers, (memory - base_memory) // worker_memory)
+    return max(1, workers)
+
+
+def thread_count(cpus, workers):
+    '''Threads per worker for THREADS_PER_CPU requests on each CPU'''
+    return max(1, min(MAX_THREADS, math.ceil(THREADS_PER_CPU * cpus
+                                             / workers)))
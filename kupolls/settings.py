@@ -10,9 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
-import sys
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,8 +47,13 @@ INSTALLED_APPS = [
     'polls.apps.PollsConfig',
 ]
 
+# WhiteNoise answers static file requests before the other middleware and
+# the views see them, so they are not counted in the request metrics.
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'polls.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,26 +62,41 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-TESTING = "test" in sys.argv
+# The debug toolbar (pip install -r requirements-dev.txt) is only imported
+# when DEBUG_TOOLBAR and DEBUG are both set.
+
+DEBUG_TOOLBAR = DEBUG and config('DEBUG_TOOLBAR', cast=bool, default=False)
 
-if not TESTING:
+if DEBUG_TOOLBAR:
     INSTALLED_APPS = [
         *INSTALLED_APPS,
-        # "debug_toolbar",
+        'debug_toolbar',
     ]
     MIDDLEWARE = [
-        # "debug_toolbar.middleware.DebugToolbarMiddleware",
+        'debug_toolbar.middleware.DebugToolbarMiddleware',
         *MIDDLEWARE,
     ]
 
 ROOT_URLCONF = 'kupolls.urls'
 
+# Templates are compiled once per process and kept by the cached loader.
+# With TEMPLATE_WARMUP, kupolls/wsgi.py and kupolls/asgi.py compile the
+# polls, registration and admin templates when the application is loaded
+# (see polls/warmup.py), instead of during the first request to each page.
+
+TEMPLATE_WARMUP = config('TEMPLATE_WARMUP', cast=bool, default=True)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -94,16 +113,175 @@ WSGI_APPLICATION = 'kupolls.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# With DATABASE_POOL each process keeps a psycopg connection pool per
+# alias, which checks connections as they are taken from it; otherwise
+# connections are kept open for DATABASE_CONN_MAX_AGE seconds (0 closes
+# them after every request) and health-checked before reuse. Use the pool
+# under ASGI, where persistent connections are tied to short-lived threads.
+
+DATABASE_POOL = config('DATABASE_POOL', cast=bool, default=False)
+
+DATABASE = {
+    'ENGINE': 'django.db.backends.postgresql',
+    "NAME": config("DATABASE_NAME", default="kupolldb"),
+    "USER": config("DATABASE_USER", default="kupolladmin"),
+    "PASSWORD": config("DATABASE_PASSWORD", default="kupolladmin"),
+    "HOST": config("DATABASE_HOST", default="localhost"),
+    "PORT": config("DATABASE_PORT", default="5432"),
+    'CONN_HEALTH_CHECKS': True,
+}
+
+if DATABASE_POOL:
+    DATABASE['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DATABASE_POOL_MIN_SIZE', cast=int, default=2),
+            'max_size': config('DATABASE_POOL_MAX_SIZE', cast=int,
+                               default=10),
+            'timeout': config('DATABASE_POOL_TIMEOUT', cast=float,
+                              default=10),
+        },
+    }
+else:
+    DATABASE['CONN_MAX_AGE'] = config('DATABASE_CONN_MAX_AGE', cast=int,
+                                      default=60)
+
+# Read replicas, as host[:port][/name] (e.g. "db-replica,db-replica2:5433"),
+# become the aliases 'replica', 'replica2', ... and polls.routers sends the
+# index, detail and results pages' reads to one of them. Writes, and reads
+# that fill shared caches, stay on 'default'. A user who has just voted
+# reads from 'default' for DATABASE_REPLICA_STICKY_SECONDS. Without
+# replicas nothing is routed to 'replica', which then points at the primary.
+
+DATABASES = {'default': DATABASE}
+DATABASE_REPLICAS = []
+for n, replica in enumerate(config('DATABASE_REPLICAS', cast=Csv(),
+                                   default=''), start=1):
+    address, _, name = replica.partition('/')
+    host, _, port = address.partition(':')
+    alias = 'replica' if n == 1 else f'replica{n}'
+    DATABASES[alias] = {
+        **DATABASE,
+        'HOST': host,
+        'PORT': port or DATABASE['PORT'],
+        'NAME': name or DATABASE['NAME'],
+        # tests run against the primary's test database
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+if not DATABASE_REPLICAS:
+    DATABASES['replica'] = {**DATABASE, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['polls.routers.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = config('DATABASE_REPLICA_STICKY_SECONDS',
+                                         cast=int, default=5)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Poll results are cached in the 'results' alias, the index page list in
+# the 'pages' alias and sessions in the 'sessions' alias. POLLS_CACHE picks
+# their backend: locmem (per process, LRU), file or redis (needs the redis
+# package; configure `maxmemory-policy allkeys-lru` on the server for LRU).
+
+POLLS_CACHE = config('POLLS_CACHE', cast=str, default='locmem')
+POLLS_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+POLLS_CACHE_LOCATIONS = {
+    'locmem': 'kupolls-{alias}',
+    'file': str(BASE_DIR / '.cache' / '{alias}'),
+    'redis': 'redis://localhost:6379/1',
+}
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        "NAME": config("DATABASE_NAME", default="kupolldb"),
-        "USER": config("DATABASE_USER", default="kupolladmin"),
-        "PASSWORD": config("DATABASE_PASSWORD", default="kupolladmin"),
-        "HOST": config("DATABASE_HOST", default="localhost"),
-        "PORT": config("DATABASE_PORT", default="5432")
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+for alias in ('results', 'pages', 'sessions'):
+    CACHES[alias] = {
+        'BACKEND': POLLS_CACHE_BACKENDS[POLLS_CACHE],
+        'LOCATION': config(
+            f'{alias.upper()}_CACHE_LOCATION', cast=str,
+            default=POLLS_CACHE_LOCATIONS[POLLS_CACHE].format(alias=alias)),
+        'KEY_PREFIX': alias,
+        'TIMEOUT': config('POLLS_CACHE_TIMEOUT', cast=int, default=60),
     }
+    if POLLS_CACHE != 'redis':
+        CACHES[alias]['OPTIONS'] = {
+            'MAX_ENTRIES': config(
+                f'{alias.upper()}_CACHE_MAX_ENTRIES', cast=int,
+                default=config('POLLS_CACHE_MAX_ENTRIES', cast=int,
+                               default=1000)),
+        }
+
+
+# Sessions: 'cached_db' reads sessions from the 'sessions' cache alias and
+# writes them to both the cache and the database; 'db' reads and writes
+# the database only; 'signed_cookies' keeps them in a signed cookie, with
+# no server-side state, so a session cannot be revoked before it expires.
+# The default is cached_db with a shared cache and db with locmem, whose
+# 'sessions' cache is per process: a session ended in one process would
+# stay cached in the others. Set SESSIONS_CACHE_MAX_ENTRIES to about the
+# number of active users; evicted sessions are read from the database again.
+# Messages are kept in a cookie rather than in the session.
+
+SESSION_STORE = config('SESSION_STORE', cast=str, default='') or (
+    'db' if POLLS_CACHE == 'locmem' else 'cached_db')
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STORE]
+SESSION_CACHE_ALIAS = 'sessions'
+
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
+# Seconds before a server process sees questions and choices changed by
+# another process (see polls/cache.py). Each process reads one row that
+# often while it serves requests.
+
+POLLS_VERSION_CHECK_INTERVAL = config('POLLS_VERSION_CHECK_INTERVAL',
+                                      cast=float, default=1.0)
+
+
+# Vote ingestion: 'sync' writes each vote in its request, 'queued' buffers
+# votes in-process and writes them in batches (see polls/ingestion.py).
+# A flush interval of 0 disables the background worker.
+
+VOTE_INGESTION = config('VOTE_INGESTION', cast=str, default='sync')
+VOTE_BATCH_SIZE = config('VOTE_BATCH_SIZE', cast=int, default=500)
+VOTE_FLUSH_INTERVAL = config('VOTE_FLUSH_INTERVAL', cast=float, default=0.5)
+
+# Serve the polls pages with the async views in polls/async_views.py,
+# for deployments behind an ASGI server (see kupolls/asgi.py).
+
+ASYNC_VIEWS = config('ASYNC_VIEWS', cast=bool, default=False)
+
+# Live results streams (see polls/live.py): how often a watched question is
+# re-read for votes from other processes, the keepalive interval, how long
+# a stream may go without an update, and the streams one process serves.
+
+LIVE_RESULTS_INTERVAL = config('LIVE_RESULTS_INTERVAL', cast=float,
+                               default=1.0)
+LIVE_RESULTS_HEARTBEAT = config('LIVE_RESULTS_HEARTBEAT', cast=float,
+                                default=15.0)
+LIVE_RESULTS_IDLE_TIMEOUT = config('LIVE_RESULTS_IDLE_TIMEOUT', cast=float,
+                                   default=300.0)
+LIVE_RESULTS_MAX_STREAMS = config('LIVE_RESULTS_MAX_STREAMS', cast=int,
+                                  default=5000)
+
+# Request metrics (see polls/metrics.py), served at /metrics: the fraction
+# of requests whose database and template time is measured, and a bearer
+# token for the scraper; without one only staff can read the metrics.
+
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', cast=float, default=0.1)
+METRICS_TOKEN = config('METRICS_TOKEN', cast=str, default='')
 
 
 # Password validation
@@ -144,6 +322,42 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# `manage.py collectstatic` copies the static files to STATIC_ROOT with a
+# hash of their contents in their names, and writes gzip and Brotli
+# copies beside them. WhiteNoiseMiddleware serves them from memory-mapped
+# files, with far-future cache headers for the hashed names. Until then,
+# and with DEBUG, pages link the unhashed names and the files are served
+# from the app directories.
+
+STATIC_ROOT = config('STATIC_ROOT', cast=str,
+                     default=str(BASE_DIR / 'staticfiles'))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        if DEBUG else 'kupolls.storage.StaticFilesStorage',
+    },
+}
+
+WHITENOISE_USE_FINDERS = DEBUG or \
+    not (Path(STATIC_ROOT) / 'staticfiles.json').exists()
+
+# seconds the unhashed names, such as polls/style.css, may be cached
+WHITENOISE_MAX_AGE = config('STATIC_MAX_AGE', cast=int,
+                            default=0 if DEBUG else 3600)
+
+# Milliseconds a new server process may take to import the application and
+# its URLconf before its first request (see `manage.py profile_startup`).
+
+STARTUP_TARGET_MS = config('STARTUP_TARGET_MS', cast=int, default=1000)
+
+# Runs the tests with the settings that they need (see kupolls/test_runner.py)
+
+TEST_RUNNER = 'kupolls.test_runner.TestRunner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -154,28 +368,39 @@ INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+# Log records are queued and written as JSON lines to LOG_FILE by a
+# background thread (see kupolls/log.py), which rotates the file at
+# LOG_MAX_BYTES, or to standard error with LOG_FILE=- (always under
+# gunicorn, whose workers cannot share a rotated file). When
+# LOG_QUEUE_SIZE records are waiting, new records are dropped, or with
+# LOG_QUEUE_POLICY=block the logging thread waits for up to
+# LOG_QUEUE_TIMEOUT seconds first.
+
 LOGGING = {
     "version": 1,  # the dictConfig format version
     "disable_existing_loggers": False,  # retain the default loggers
-    "level": "INFO",
     "loggers": {
         "": {
-            "level": "DEBUG",
-            "handlers": ["simple"],
+            "level": config("LOG_LEVEL", cast=str, default="INFO"),
+            "handlers": ["file"],
         },
     },
     "formatters": {
-        "verbose": {
-            "format": "{asctime} {module} {message} {levelname} {name} \
-                {process:d} {thread:d} ",
-            "style": "{",
+        "json": {
+            "()": "kupolls.log.JsonFormatter",
         },
     },
     "handlers": {
-        "simple": {
-            "class": "logging.FileHandler",
-            "filename": "kupolls.log",
-            "formatter": "verbose",
+        "file": {
+            "()": "kupolls.log.QueuedFileHandler",
+            "filename": config("LOG_FILE", cast=str, default="kupolls.log"),
+            "max_bytes": config("LOG_MAX_BYTES", cast=int,
+                                default=10 * 1024 * 1024),
+            "backup_count": config("LOG_BACKUP_COUNT", cast=int, default=5),
+            "queue_size": config("LOG_QUEUE_SIZE", cast=int, default=10000),
+            "policy": config("LOG_QUEUE_POLICY", cast=str, default="drop"),
+            "timeout": config("LOG_QUEUE_TIMEOUT", cast=float, default=1.0),
+            "formatter": "json",
         }
     },
 }
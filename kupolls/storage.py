@@ -0,0 +1,17 @@
+'''
+Static files storage of the project (STORAGES['staticfiles'] in settings).
+'''
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    '''
+    WhiteNoise's hashed and compressed storage, which links the unhashed
+    names until collectstatic has written a manifest, instead of failing
+    every page of a checkout that was never collected.
+    '''
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
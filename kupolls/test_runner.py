@@ -0,0 +1,35 @@
+'''
+Test runner of the project (TEST_RUNNER in settings).
+'''
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+# tests run without collectstatic: use unhashed names, and look the files
+# up per request instead of scanning an empty STATIC_ROOT
+TEST_SETTINGS = {
+    'STORAGES': {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        },
+    },
+    'WHITENOISE_AUTOREFRESH': True,
+    # the polls version is read again only after a change, so that query
+    # counts do not depend on how long a test takes
+    'POLLS_VERSION_CHECK_INTERVAL': 3600,
+}
+
+
+class TestRunner(DiscoverRunner):
+    '''DiscoverRunner that applies TEST_SETTINGS while the tests run'''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -19,19 +19,18 @@ from django.urls import path, include
 from django.shortcuts import redirect
 from django.views.generic.base import RedirectView
 from django.conf import settings
-from debug_toolbar.toolbar import debug_toolbar_urls
 from polls import views
 
 urlpatterns = [
     path('', RedirectView.as_view(pattern_name='polls:index', permanent=False),
          name='index'),
     path('signup/', views.signup, name='signup'),
+    path('metrics', views.metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('polls/', include('polls.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
 ]
 
-if not settings.TESTING:
-    urlpatterns = [
-        *urlpatterns,
-    ] + debug_toolbar_urls()
+if settings.DEBUG_TOOLBAR:
+    from debug_toolbar.toolbar import debug_toolbar_urls
+    urlpatterns += debug_toolbar_urls()
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .export import export_response
 from .models import Question, Choice
 
 # Register your models here.
@@ -7,6 +8,19 @@ from .models import Question, Choice
 class ChoiceInLine(admin.TabularInline):
     model = Choice
     extra = 1
+    # kept by the votes; a saved form must not write back a stale tally
+    readonly_fields = ['vote_count']
+
+
+def export_action(kind, fmt):
+    '''Admin action downloading the kind export of the selected questions'''
+    @admin.action(description=f'Export {kind} of selected questions '
+                              f'({fmt.upper()})')
+    def action(modeladmin, request, queryset):
+        question_ids = list(queryset.values_list('pk', flat=True))
+        return export_response(request, kind, fmt, question_ids)
+    action.__name__ = f'export_{kind}_{fmt}'
+    return action
 
 
 class QuestionAdmin(admin.ModelAdmin):
@@ -18,6 +32,9 @@ class QuestionAdmin(admin.ModelAdmin):
     inlines = [ChoiceInLine]
     list_filter = ['pub_date']
     search_fields = ['question_text']
+    actions = [export_action(kind, fmt)
+               for kind in ('results', 'votes')
+               for fmt in ('csv', 'ndjson')]
 
 
 admin.site.register(Question, QuestionAdmin)
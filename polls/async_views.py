@@ -0,0 +1,190 @@
+'''
+Async versions of the index, detail, results and vote views, served under
+the same URL names when ASYNC_VIEWS is set (see polls/urls.py), and the
+live results stream, which is served in both modes.
+
+Django's async ORM methods still run each query in a worker thread, so
+these views gain most on the paths that skip the database: a cached poll
+list, cached results and the poll state index are read without leaving
+the event loop.
+'''
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from .cache import apolls_version, results_cache
+from .ingestion import record_vote, vote_buffer
+from .live import can_stream, encode_event, publisher, snapshot
+from .models import Choice, Question, Vote
+from .results import with_pending_vote
+from .routers import primary, stick_to_primary
+from .state import poll_state
+
+
+logger = logging.getLogger(__name__)
+
+# same fragment name and timeout as the {% cache %} tag in index.html
+POLL_LIST_FRAGMENT = 'polls_index'
+POLL_LIST_TIMEOUT = 3600
+
+
+async def index(request):
+    '''Shows list of available polls'''
+    version = await apolls_version()
+    cache = caches['pages']
+    key = make_template_fragment_key(POLL_LIST_FRAGMENT, [version])
+    poll_list = cache.get(key)
+    if poll_list is None:
+        questions = Question.objects.using(primary(Question)).published() \
+            .with_choices().order_by('pub_date')[:5]
+        poll_list = render_to_string('polls/poll_list.html', {
+            'questions_list': [question async for question in questions],
+            'open_ids': await poll_state.aopen_ids(),
+        })
+        cache.set(key, poll_list, POLL_LIST_TIMEOUT)
+    return render(request, 'polls/index.html', {
+        'poll_list': poll_list,
+        'polls_version': version,
+        'user': await request.auser(),
+    })
+
+
+async def detail(request, pk):
+    '''Shows the choices and let users vote'''
+    if not await poll_state.ais_published(pk):
+        messages.error(request,
+                       'The poll you are trying to access \
+                       does not exists.')
+        return redirect('polls:index')
+
+    if not await poll_state.acan_vote(pk):
+        messages.error(request,
+                       'The poll you are trying to access \
+                       is not in the voting period.')
+        return redirect('polls:index')
+    try:
+        question = await Question.objects.published() \
+            .prefetch_related('choice_set').aget(pk=pk)
+    except Question.DoesNotExist:
+        messages.error(request,
+                       'The poll you are trying to access \
+                       does not exists.')
+        return redirect('polls:index')
+    return render(request, 'polls/detail.html', {
+        'object': question,
+        'question': question,
+        'user': await request.auser(),
+    })
+
+
+async def results(request, pk):
+    '''Shows the result of the polls'''
+    try:
+        question = await Question.objects.aget(pk=pk)
+    except Question.DoesNotExist:
+        raise Http404('No question found matching the query')
+    rows, total_votes = await results_cache.aresults(question)
+    user = await request.auser()
+    if settings.VOTE_INGESTION == 'queued':
+        rows, total_votes = await with_own_vote(user, question,
+                                                rows, total_votes)
+    return render(request, 'polls/results.html', {
+        'object': question,
+        'question': question,
+        'results': rows,
+        'total_votes': total_votes,
+        'user': user,
+        'live_results': can_stream(request),
+    })
+
+
+async def with_own_vote(user, question, rows, total_votes):
+    '''Show the user's own vote even if it is still queued'''
+    if not user.is_authenticated:
+        return rows, total_votes
+    pending = vote_buffer.pending_choice(user.pk, question.pk)
+    if pending is None:
+        return rows, total_votes
+    previous = await Vote.objects.filter(user=user, question=question) \
+        .values_list('choice', flat=True).afirst()
+    return with_pending_vote(rows, previous, pending)
+
+
+@login_required
+async def vote(request, question_id):
+    '''
+    Used for voting
+    '''
+    question = await aget_object_or_404(Question, pk=question_id)
+    user = await request.auser()
+    try:
+        selected_choice = await question.choice_set.aget(
+            pk=request.POST['choice'])
+    except (KeyError, Choice.DoesNotExist):
+        logger.error("%s did not select a choice.", user.username)
+        messages.error(request, "You didn't select a choice.")
+        return redirect('polls:detail', question_id)
+    # the write needs a transaction, which the async ORM cannot open
+    if await sync_to_async(record_vote)(user, selected_choice):
+        messages.success(request,
+                         f'Your vote for "{selected_choice}" has been recorded.')
+        logger.info("%s voted for %s", user.username,
+                    selected_choice.choice_text)
+        return stick_to_primary(redirect('polls:results', question.id))
+    return redirect('polls:results', question.id)
+
+
+async def results_stream(request, pk):
+    '''
+    Stream the results of a question as Server-Sent Events: a "results"
+    snapshot, then a "delta" with the changed choices after every vote.
+
+    Under WSGI a stream would hold a worker thread, so the results page
+    does not open one, and a client that asks anyway is sent a single
+    snapshot and polls at the retry interval.
+    '''
+    if not await poll_state.ais_published(pk):
+        raise Http404('No question found matching the query')
+    retry = f'retry: {int(settings.LIVE_RESULTS_INTERVAL * 1000)}\n\n'
+    if not can_stream(request):
+        rows, total_votes = await results_cache.aresults(Question(pk=pk))
+        event = encode_event('results', 0, snapshot(rows, total_votes))
+        return HttpResponse(retry + event, content_type='text/event-stream')
+
+    if publisher.full():
+        response = HttpResponse('Too many live results streams.',
+                                status=503)
+        response['Retry-After'] = int(settings.LIVE_RESULTS_IDLE_TIMEOUT)
+        return response
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        idle_until = loop.time() + settings.LIVE_RESULTS_IDLE_TIMEOUT
+        subscriber = publisher.subscribe(pk)
+        try:
+            yield retry
+            while (remaining := idle_until - loop.time()) > 0:
+                event = await subscriber.wait(
+                    min(remaining, settings.LIVE_RESULTS_HEARTBEAT))
+                if event is not None:
+                    idle_until = loop.time() + \
+                        settings.LIVE_RESULTS_IDLE_TIMEOUT
+                    yield event
+                elif loop.time() < idle_until:
+                    # keeps proxies from closing a quiet connection
+                    yield ': keepalive\n\n'
+        finally:
+            publisher.unsubscribe(subscriber)
+
+    response = StreamingHttpResponse(events(),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
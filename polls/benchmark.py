@@ -0,0 +1,193 @@
+'''
+Helpers shared by the bench_* management commands.
+'''
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from django.conf import settings
+from django.db import transaction
+
+
+def percentile(samples, pct):
+    '''Return the pct-th percentile of samples (nearest rank)'''
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1,
+                      round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    '''Latency summary in milliseconds for a list of durations in seconds'''
+    millis = [s * 1000 for s in samples]
+    return {
+        'count': len(millis),
+        'mean_ms': sum(millis) / len(millis) if millis else 0.0,
+        'p50_ms': percentile(millis, 50),
+        'p95_ms': percentile(millis, 95),
+        'p99_ms': percentile(millis, 99),
+    }
+
+
+def measure(func, repeat):
+    '''Call func `repeat` times and summarize how long each call took'''
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+@contextmanager
+def rolled_back():
+    '''
+    Run the block in a transaction that is always rolled back, so that
+    benchmark data never stays in the database.
+    '''
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+# not in INTERNAL_IPS, so the debug toolbar stays out of the measurement
+CLIENT_ADDR = '192.0.2.1'
+
+
+def wsgi_environ(path, host):
+    '''A WSGI environ for GET path'''
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'REMOTE_ADDR': CLIENT_ADDR,
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def asgi_scope(path, host):
+    '''An ASGI HTTP scope for GET path'''
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', host.encode())],
+        'client': (CLIENT_ADDR, 50000),
+        'server': (host, 80),
+    }
+
+
+def wsgi_load(application, paths, count, concurrency, host):
+    '''
+    Send count GET requests, cycling through paths, to a WSGI application
+    from `concurrency` threads. Return (seconds, latencies, statuses).
+    '''
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def request(n):
+        start = time.perf_counter()
+        response = application(wsgi_environ(paths[n % len(paths)], host),
+                               lambda status, headers: None)
+        b''.join(response)
+        response.close()
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(request, range(count)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def run_command(name, *args, env=None):
+    '''
+    Run management command name in a fresh process, so that it reads its
+    settings from env, and return the JSON it prints last.
+    '''
+    command = [sys.executable, str(settings.BASE_DIR / 'manage.py'),
+               name, *map(str, args)]
+    output = subprocess.run(command, env=dict(os.environ, **(env or {})),
+                            check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# what a worker does before it can answer its first request
+STARTUP_SCRIPT = ('import importlib, sys; '
+                  'importlib.import_module(sys.argv[1]); '
+                  'from django.urls import get_resolver; '
+                  'get_resolver().url_patterns')
+
+
+def startup(module, importtime=False):
+    '''
+    Start a fresh interpreter that imports the application module and the
+    URLconf, as a worker does before its first request. Return how many
+    seconds that took and, with importtime, the parsed output of
+    `python -X importtime`.
+    '''
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []),
+               '-c', STARTUP_SCRIPT, module]
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=settings.BASE_DIR,
+                             check=True, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    return seconds, import_times(process.stderr) if importtime else None
+
+
+def import_times(output):
+    '''
+    {module: (self, cumulative)} import times in microseconds from the
+    output of `python -X importtime`
+    '''
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def regressions(endpoints, baseline, tolerance):
+    '''
+    Compare per-endpoint results with those of a baseline run and return
+    a message for each endpoint whose p95 latency grew by more than
+    tolerance (a fraction) or that ran more queries.
+    '''
+    found = []
+    for name, result in endpoints.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {result['p95_ms']:.2f}ms, was "
+                         f"{before['p95_ms']:.2f}ms")
+        if result['queries_max'] > before['queries_max']:
+            found.append(f"{name}: {result['queries_max']} queries, was "
+                         f"{before['queries_max']}")
+    return found
@@ -0,0 +1,239 @@
+'''
+Caches in front of the results engine and the index page.
+
+Results are stored per question in the 'results' cache alias (see CACHES
+in settings), and every write that changes a tally invalidates the entry
+of its question. The index page's poll list is cached in the 'pages'
+alias under the current polls version.
+
+The polls version and generation are kept in the PollsVersion row, so
+that every process sees a change made by another one, whatever the cache
+backend, within POLLS_VERSION_CHECK_INTERVAL seconds.
+'''
+import threading
+import time
+import uuid
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from .results import aquestion_results, question_results
+from .routers import primary
+
+
+# sent with question_ids once a committed write has changed their results
+results_changed = Signal()
+
+
+class ResultsCache:
+    '''Per-question results cache that counts its hits and misses'''
+
+    def __init__(self, alias='results'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(question_id):
+        return f'polls:results:{question_id}'
+
+    def results(self, question):
+        '''Return (rows, total_votes) for question, as question_results()'''
+        cached = self._lookup(question.pk)
+        if cached is None:
+            cached = question_results(question)
+            self.cache.set(self.key(question.pk), cached)
+        return cached
+
+    async def aresults(self, question):
+        '''
+        Async version of results(). A hit is read without leaving the
+        event loop; only a miss queries the database.
+        '''
+        cached = self._lookup(question.pk)
+        if cached is None:
+            cached = await aquestion_results(question)
+            self.cache.set(self.key(question.pk), cached)
+        return cached
+
+    def _lookup(self, question_id):
+        cached = self.cache.get(self.key(question_id))
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return cached
+
+    def invalidate(self, *question_ids):
+        '''
+        Drop the results of question_ids now, so reads in the current
+        transaction miss, and again on commit, so an entry cached from
+        the old tallies in between does not outlive the transaction.
+        '''
+        keys = [self.key(question_id) for question_id in question_ids]
+        self.cache.delete_many(keys)
+
+        def committed():
+            self.cache.delete_many(keys)
+            results_changed.send(sender=self.__class__,
+                                 question_ids=question_ids)
+        transaction.on_commit(committed)
+
+    def stats(self):
+        '''Hit and miss counts of this process'''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+results_cache = ResultsCache()
+
+
+def new_token():
+    return uuid.uuid4().hex
+
+
+class SharedVersions:
+    '''
+    This process's copy of the PollsVersion row, read again at most every
+    POLLS_VERSION_CHECK_INTERVAL seconds. Changes made by this process are
+    copied as they are written.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = None
+        self._checked_at = None
+        # (version, expires, token) of the index page's poll list
+        self._index = None
+
+    def check_due(self):
+        return self._checked_at is None or time.monotonic() - \
+            self._checked_at >= settings.POLLS_VERSION_CHECK_INTERVAL
+
+    def tokens(self):
+        '''(version, generation) as last read from the database'''
+        with self._lock:
+            if self.check_due():
+                self._tokens = self._read()
+                self._checked_at = time.monotonic()
+            return self._tokens
+
+    def last_tokens(self):
+        '''tokens() without reading the database; None before the first'''
+        return self._tokens
+
+    async def atokens(self):
+        '''Async version of tokens(); only a due read needs a thread'''
+        if self.check_due():
+            return await sync_to_async(self.tokens)()
+        return self._tokens
+
+    @staticmethod
+    def _read():
+        from .models import PollsVersion
+
+        return PollsVersion.objects.using(primary(PollsVersion)) \
+            .values_list('version', 'generation').first() or ('', '')
+
+    def bump(self, generation=False):
+        '''Give the version, and the generation if asked, new tokens'''
+        from .models import PollsVersion
+
+        tokens = {'version': new_token()}
+        if generation:
+            tokens['generation'] = new_token()
+        row, _ = PollsVersion.objects.update_or_create(pk=PollsVersion.ROW,
+                                                       defaults=tokens)
+
+        def remember():
+            with self._lock:
+                self._tokens = (row.version, row.generation)
+                self._checked_at = time.monotonic()
+        # this process sees its own change at once, and again on commit in
+        # case another thread read the old row in between; a rolled-back
+        # change is read back from the database after the check interval
+        remember()
+        transaction.on_commit(remember)
+
+    def index_version(self, version, now):
+        '''
+        The index version for version, or None if there is none yet or a
+        poll has opened or closed since it was made.
+        '''
+        index = self._index
+        if index is None or index[0] != version or (
+                index[1] is not None and now >= index[1]):
+            return None
+        return index[2]
+
+    def new_index_version(self, version, expires):
+        '''
+        Start an index version that lasts until the next transition. The
+        token only depends on the two, so processes agree on it.
+        '''
+        token = f"{version}-{expires.timestamp() if expires else 'none'}"
+        self._index = (version, expires, token)
+        return token
+
+
+shared_versions = SharedVersions()
+
+
+def polls_version():
+    '''
+    Return a token that changes whenever a question or choice changes
+    (see bump_polls_version) and whenever a poll opens or closes.
+    '''
+    from .models import Question
+
+    version = shared_versions.tokens()[0]
+    now = timezone.now()
+    token = shared_versions.index_version(version, now)
+    if token is None:
+        token = shared_versions.new_index_version(
+            version, Question.objects.using(primary(Question))
+            .next_transition(now))
+    return token
+
+
+async def apolls_version():
+    '''Async version of polls_version()'''
+    from .models import Question
+
+    version = (await shared_versions.atokens())[0]
+    now = timezone.now()
+    token = shared_versions.index_version(version, now)
+    if token is None:
+        token = shared_versions.new_index_version(
+            version, await Question.objects.using(primary(Question))
+            .anext_transition(now))
+    return token
+
+
+def polls_generation():
+    '''
+    Return a token that changes whenever a question is added or removed,
+    or its pub_date or end_date changes, but not when polls open or close.
+    '''
+    return shared_versions.tokens()[1]
+
+
+def bump_polls_version(generation=False):
+    '''
+    Start a new polls version, and a new generation too if generation is
+    set, as part of the current transaction.
+    '''
+    shared_versions.bump(generation)
@@ -0,0 +1,157 @@
+'''
+Synthetic datasets for load testing.
+
+generate() creates users, questions and choices with bulk inserts and
+casts votes skewed the way real polls are: a few hot questions draw most
+of the votes, and within a question the first choices are the popular
+ones. Everything it creates is named with DATASET_PREFIX, and its users
+and questions are recorded as DatasetMembers, so that delete_dataset()
+removes them again, and nothing else.
+'''
+import datetime
+import itertools
+import random
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .cache import bump_polls_version
+from .models import Choice, DatasetMember, Question, Vote
+from .state import poll_state
+
+DATASET_PREFIX = 'load-'
+DATASET_BATCH_SIZE = 5000
+
+# rows of the questions recorded as dataset members
+DELETE_DATASET_ROWS_SQL = '''
+DELETE FROM {table} WHERE {column} IN (
+    SELECT {member_question} FROM {members}
+    WHERE {member_question} IS NOT NULL)
+'''
+
+
+def generate(users, questions, choices, votes, hot_fraction=0.05,
+             hot_share=0.8, seed=None):
+    '''
+    Create the dataset and return the primary keys of its users and
+    questions. One question in ten is not published yet and one in ten is
+    closed. hot_share of the votes go to the first hot_fraction of the
+    published questions, at most one per user per question.
+    '''
+    rng = random.Random(seed)
+    now = timezone.now()
+    with transaction.atomic():
+        user_ids = _bulk_ids(User, [
+            User(username=f'{DATASET_PREFIX}user-{n}')
+            for n in range(users)])
+        question_rows = []
+        for n in range(questions):
+            pub_date = now - datetime.timedelta(
+                days=rng.randint(1, 365), seconds=rng.randint(0, 86399))
+            end_date = None
+            if n % 10 == 9:
+                pub_date = now + datetime.timedelta(days=rng.randint(1, 30))
+            elif n % 10 == 8:
+                end_date = now - datetime.timedelta(hours=rng.randint(1, 24))
+            question_rows.append(Question(
+                question_text=f'{DATASET_PREFIX}question {n}',
+                pub_date=pub_date, end_date=end_date))
+        question_ids = _bulk_ids(Question, question_rows)
+        _bulk_ids(DatasetMember,
+                  [DatasetMember(user_id=pk) for pk in user_ids]
+                  + [DatasetMember(question_id=pk) for pk in question_ids])
+        choice_ids = {}
+        for start in range(0, len(question_ids), DATASET_BATCH_SIZE):
+            batch = [Choice(question_id=question_id,
+                            choice_text=f'{DATASET_PREFIX}choice {c}')
+                     for question_id in
+                     question_ids[start:start + DATASET_BATCH_SIZE]
+                     for c in range(choices)]
+            for choice in Choice.objects.bulk_create(batch):
+                choice_ids.setdefault(choice.question_id, []) \
+                    .append(choice.pk)
+        published = [question_id for n, question_id in enumerate(question_ids)
+                     if n % 10 != 9]
+        _cast(rng, user_ids, published, choice_ids, votes, hot_fraction,
+              hot_share)
+        _recount(question_ids)
+    poll_state.invalidate()
+    bump_polls_version(generation=True)
+    return user_ids, question_ids
+
+
+def _bulk_ids(model, objects):
+    '''bulk_create objects in batches and return their primary keys'''
+    ids = []
+    for start in range(0, len(objects), DATASET_BATCH_SIZE):
+        ids += [obj.pk for obj in model.objects.bulk_create(
+            objects[start:start + DATASET_BATCH_SIZE])]
+    return ids
+
+
+def _cast(rng, user_ids, question_ids, choice_ids, votes, hot_fraction,
+          hot_share):
+    '''Insert up to `votes` votes with the skew described in generate()'''
+    if not user_ids or not choice_ids or not votes:
+        return
+    hot = max(1, round(len(question_ids) * hot_fraction))
+    cold = len(question_ids) - hot
+    weights = [hot_share / hot] * hot + \
+        [(1 - hot_share) / cold] * cold if cold else [1] * hot
+    cum_weights = list(itertools.accumulate(weights))
+    # Zipf-like popularity: choice c is 1/(c+1) as popular as the first
+    choice_weights = list(itertools.accumulate(
+        1 / (c + 1) for c in range(len(choice_ids[question_ids[0]]))))
+    votes = min(votes, len(user_ids) * len(question_ids))
+    # a dict rather than a set, to keep the order and the dataset repeatable
+    cast = {}
+    # repeat votes by a user on a question are dropped, so draw again for
+    # them, up to a limit for when the hot questions are nearly full
+    for _ in range(10):
+        missing = votes - len(cast)
+        if not missing:
+            break
+        cast.update(dict.fromkeys(zip(
+            rng.choices(user_ids, k=missing),
+            rng.choices(question_ids, cum_weights=cum_weights, k=missing))))
+    rows = [Vote(user_id=user_id, question_id=question_id,
+                 choice_id=rng.choices(choice_ids[question_id],
+                                       cum_weights=choice_weights)[0])
+            for user_id, question_id in cast]
+    Vote.objects.bulk_create(rows, batch_size=DATASET_BATCH_SIZE)
+
+
+def _recount(question_ids):
+    '''Set vote_count of the questions' choices from their votes'''
+    counts = Vote.objects.filter(choice=OuterRef('pk')) \
+        .order_by().values('choice') \
+        .annotate(total=Count('pk')).values('total')
+    Choice.objects.filter(question__in=question_ids) \
+        .update(vote_count=Coalesce(Subquery(counts), Value(0)))
+
+
+def delete_dataset():
+    '''Delete everything generate() created; return the questions deleted'''
+    members = DatasetMember._meta
+    names = {'members': members.db_table,
+             'member_question': members.get_field('question').column}
+    using = router.db_for_write(Question)
+    with transaction.atomic(using=using), \
+            connections[using].cursor() as cursor:
+        # plain DELETEs: QuerySet.delete() would load every vote to send
+        # the post_delete signals, which adjust the tallies of choices that
+        # are deleted as well. Foreign keys are checked on commit, once the
+        # members pointing at the questions are gone too.
+        for model, field in ((Vote, 'question'), (Choice, 'question'),
+                             (Question, 'id')):
+            cursor.execute(DELETE_DATASET_ROWS_SQL.format(
+                table=model._meta.db_table,
+                column=model._meta.get_field(field).column, **names))
+        deleted = cursor.rowcount
+        DatasetMember.objects.filter(question__isnull=False).delete()
+        User.objects.filter(pk__in=DatasetMember.objects.values('user')) \
+            .delete()
+    poll_state.invalidate()
+    bump_polls_version(generation=True)
+    return deleted
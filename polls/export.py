@@ -0,0 +1,133 @@
+'''
+Streaming export of poll results and raw votes as CSV or NDJSON.
+
+Rows are read with .iterator(chunk_size=EXPORT_CHUNK_SIZE), which uses a
+server-side cursor on PostgreSQL, and encoded as they are read, so an
+export holds one chunk of rows in memory however many votes it covers.
+'''
+import csv
+import json
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F, Sum, Window
+from django.http import StreamingHttpResponse
+from .models import Choice, Vote
+from .results import format_percent
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+RESULTS_FIELDS = ['question_id', 'question_text', 'choice_id', 'choice_text',
+                  'votes', 'percent']
+VOTES_FIELDS = ['id', 'question_id', 'choice_id', 'choice_text', 'user_id',
+                'username']
+
+
+def results_rows(question_ids=None):
+    '''
+    Rows of RESULTS_FIELDS for every choice of question_ids (all questions
+    if None), as (queryset, function turning a database row into a row).
+    '''
+    # values() rather than values_list(): the latter runs its query as soon
+    # as it is iterated, which aiterator() does in the event loop
+    choices = Choice.objects.all()
+    if question_ids is not None:
+        choices = choices.filter(question__in=question_ids)
+    choices = choices.order_by('question', 'pk') \
+        .annotate(total=Window(Sum('vote_count'),
+                               partition_by=[F('question')])) \
+        .values('question', 'question__question_text', 'pk', 'choice_text',
+                'vote_count', 'total')
+
+    def row(values):
+        return (values['question'], values['question__question_text'],
+                values['pk'], values['choice_text'], values['vote_count'],
+                format_percent(values['vote_count'], values['total']))
+    return choices, row
+
+
+def votes_rows(question_ids=None):
+    '''Rows of VOTES_FIELDS for the votes on question_ids, as results_rows()'''
+    votes = Vote.objects.all()
+    if question_ids is not None:
+        votes = votes.filter(question__in=question_ids)
+    fields = ['pk', 'question', 'choice', 'choice__choice_text', 'user',
+              'user__username']
+    votes = votes.order_by('pk').values(*fields)
+    return votes, lambda values: [values[field] for field in fields]
+
+
+EXPORTS = {
+    'results': (RESULTS_FIELDS, results_rows),
+    'votes': (VOTES_FIELDS, votes_rows),
+}
+
+
+class Echo:
+    '''File-like object whose write() returns what is written, for csv'''
+
+    def write(self, value):
+        return value
+
+
+def encoder(fmt, fields):
+    '''Return a function that encodes one row as a line of fmt'''
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        return writer.writerow
+    return lambda row: json.dumps(dict(zip(fields, row))) + '\n'
+
+
+def export(kind, fmt, question_ids=None):
+    '''Yield the export as strings, each holding up to a chunk of rows'''
+    fields, rows = EXPORTS[kind]
+    queryset, row = rows(question_ids)
+    encode = encoder(fmt, fields)
+    if fmt == 'csv':
+        yield encode(fields)
+    lines = []
+    for values in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        lines.append(encode(row(values)))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+async def aexport(kind, fmt, question_ids=None):
+    '''Async version of export()'''
+    fields, rows = EXPORTS[kind]
+    queryset, row = rows(question_ids)
+    encode = encoder(fmt, fields)
+    if fmt == 'csv':
+        yield encode(fields)
+    lines = []
+    async for values in queryset.aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        lines.append(encode(row(values)))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def export_response(request, kind, fmt, question_ids=None):
+    '''
+    A StreamingHttpResponse downloading the export. Under ASGI it streams
+    from an async iterator, which Django would otherwise read to the end
+    before sending anything.
+    '''
+    if isinstance(request, ASGIRequest):
+        content = aexport(kind, fmt, question_ids)
+    else:
+        content = export(kind, fmt, question_ids)
+    response = StreamingHttpResponse(content,
+                                     content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = \
+        f'attachment; filename="polls-{kind}.{fmt}"'
+    return response
@@ -0,0 +1,119 @@
+'''
+Bulk loading of JSON fixtures.
+
+Unlike loaddata, which reads a whole fixture into memory and saves its
+objects one at a time, load_fixture() reads the file incrementally and
+inserts its objects with bulk_create in batches of FIXTURE_BATCH_SIZE.
+Objects whose primary key is already in the database are skipped, so
+loading a fixture again writes nothing. As with loaddata, objects are
+inserted as they are, without calling save() or sending signals.
+'''
+import json
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import DEFAULT_DB_ALIAS, connections
+
+FIXTURE_BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+
+
+def iter_fixture(stream, read_size=READ_SIZE):
+    '''
+    Yield the objects of the JSON array in stream one at a time, holding
+    only the text of the object being decoded in memory.
+    '''
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = stream.read(read_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def next_token():
+        '''Skip whitespace and return the next character, '' at the end'''
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            fill()
+
+    if next_token() != '[':
+        raise ValueError('A fixture must be a JSON array')
+    position += 1
+    expect_item = True
+    while True:
+        token = next_token()
+        if token == ']':
+            return
+        if token == ',' and not expect_item:
+            position += 1
+            expect_item = True
+            continue
+        if token != '{' or not expect_item:
+            raise ValueError(f'Unexpected {token or "end of file"!r} in '
+                             'fixture')
+        # an object is incomplete until its closing brace has been read
+        while True:
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+        expect_item = False
+        yield item
+
+
+def load_fixture(stream, using=DEFAULT_DB_ALIAS,
+                 batch_size=FIXTURE_BATCH_SIZE):
+    '''
+    Insert the objects of the JSON fixture in stream that are not in the
+    database yet. Return {model: [objects read, objects inserted]}. Run it
+    in a transaction, so that references between objects are only checked
+    once everything is in.
+    '''
+    counts = {}
+    batch = []
+    for deserialized in Deserializer(iter_fixture(stream), using=using):
+        model = deserialized.object.__class__
+        if batch and (len(batch) == batch_size
+                      or batch[0].object.__class__ is not model):
+            _insert(batch, using, counts)
+            batch = []
+        batch.append(deserialized)
+    if batch:
+        _insert(batch, using, counts)
+    if counts:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), counts):
+                cursor.execute(sql)
+    return counts
+
+
+def _insert(batch, using, counts):
+    '''Insert the objects of batch, all of one model, that are new'''
+    model = batch[0].object.__class__
+    manager = model._base_manager.using(using)
+    existing = set(manager.filter(
+        pk__in=[item.object.pk for item in batch if item.object.pk is not None]
+    ).values_list('pk', flat=True))
+    new = [item for item in batch if item.object.pk not in existing]
+    manager.bulk_create([item.object for item in new], ignore_conflicts=True)
+    for name in {name for item in new for name in item.m2m_data}:
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        source = field.m2m_field_name() + '_id'
+        target = field.m2m_reverse_field_name() + '_id'
+        through._base_manager.using(using).bulk_create(
+            [through(**{source: item.object.pk, target: pk})
+             for item in new for pk in item.m2m_data.get(name, ())],
+            ignore_conflicts=True)
+    read, inserted = counts.setdefault(model, [0, 0])
+    counts[model] = [read + len(batch), inserted + len(new)]
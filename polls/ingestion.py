@@ -0,0 +1,199 @@
+'''
+Vote ingestion.
+
+With VOTE_INGESTION = 'sync' (the default) every vote is written in the
+request that casts it. With 'queued' the vote view only validates the vote
+and adds it to the process-wide VoteBuffer; a worker thread writes the
+buffer in batches of VOTE_BATCH_SIZE every VOTE_FLUSH_INTERVAL seconds,
+and whatever is still pending is written when the process exits.
+
+Only the process holding a queued vote can show it to its voter before it
+is written. With several server processes, a voter whose next request
+goes to another process sees the vote after the next flush.
+'''
+import atexit
+import itertools
+import logging
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from .cache import results_cache
+from .models import Choice, Question, Vote
+from .state import poll_state
+
+
+logger = logging.getLogger(__name__)
+
+
+def record_vote(user, choice):
+    '''
+    Record user's vote for choice using the configured ingestion mode.
+    Return False if the question is not open for voting.
+    '''
+    if settings.VOTE_INGESTION == 'queued':
+        return vote_buffer.add(user, choice)
+    with transaction.atomic():
+        return Vote.objects.cast(user, choice) is not None
+
+
+def write_votes(batch):
+    '''
+    Write a batch of {(user_id, question_id): choice_id} votes with one
+    bulk upsert and move the tallies by the net change, in one transaction.
+    '''
+    question_ids = sorted({question_id for _, question_id in batch})
+    user_ids = {user_id for user_id, _ in batch}
+    with transaction.atomic():
+        # Locking the questions serialises batches that touch the same
+        # questions, including batches flushed by other processes.
+        list(Question.objects.select_for_update()
+             .filter(pk__in=question_ids).order_by('pk')
+             .values_list('pk', flat=True))
+        previous = {
+            (user_id, question_id): choice_id
+            for user_id, question_id, choice_id in Vote.objects
+            .filter(user__in=user_ids, question__in=question_ids)
+            .values_list('user', 'question', 'choice')
+            if (user_id, question_id) in batch
+        }
+        changed = {key: choice_id for key, choice_id in batch.items()
+                   if previous.get(key) != choice_id}
+        if not changed:
+            return
+        Vote.objects.bulk_create(
+            [Vote(user_id=user_id, question_id=question_id,
+                  choice_id=choice_id)
+             for (user_id, question_id), choice_id in changed.items()],
+            update_conflicts=True,
+            unique_fields=['user', 'question'],
+            update_fields=['choice'],
+        )
+        tally = Counter()
+        for key, choice_id in changed.items():
+            tally[choice_id] += 1
+            if key in previous:
+                tally[previous[key]] -= 1
+        Choice.objects.filter(pk__in=tally).update(
+            vote_count=F('vote_count') + Case(
+                *[When(pk=pk, then=Value(delta))
+                  for pk, delta in tally.items()],
+                default=Value(0)))
+        results_cache.invalidate(*question_ids)
+
+
+class VoteBuffer:
+    '''
+    Votes waiting to be written, keyed by (user id, question id) so that
+    a user who votes again before a flush only costs one write. A vote
+    stays visible through pending_choice() until it has been written.
+    '''
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def add(self, user, choice):
+        '''
+        Queue user's vote for choice. Return False if the question is not
+        open for voting.
+        '''
+        if not poll_state.can_vote(choice.question_id):
+            return False
+        with self._lock:
+            self._pending[(user.pk, choice.question_id)] = choice.pk
+            full = len(self._pending) >= settings.VOTE_BATCH_SIZE
+        if settings.VOTE_FLUSH_INTERVAL > 0:
+            self._start_worker()
+            if full:
+                self._wakeup.set()
+        elif full:
+            # no worker, so the request that fills the batch writes it
+            self.flush()
+        return True
+
+    def pending_choice(self, user_id, question_id):
+        '''The choice id user_id has queued on question_id, if any'''
+        with self._lock:
+            return self._pending.get((user_id, question_id))
+
+    def flush(self):
+        '''Write every pending vote in batches. Return how many were written'''
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = dict(itertools.islice(
+                        self._pending.items(), settings.VOTE_BATCH_SIZE))
+                if not batch:
+                    break
+                try:
+                    write_votes(batch)
+                except IntegrityError:
+                    # a user or choice was deleted; write the votes one at
+                    # a time so that only theirs are dropped
+                    written += self._write_each(batch)
+                except Exception:
+                    logger.exception("Could not write %d queued votes",
+                                     len(batch))
+                    break
+                else:
+                    written += len(batch)
+                with self._lock:
+                    for key, choice_id in batch.items():
+                        if self._pending.get(key) == choice_id:
+                            del self._pending[key]
+        return written
+
+    @staticmethod
+    def _write_each(batch):
+        '''Write the votes of batch one by one; return how many were written'''
+        written = 0
+        for (user_id, question_id), choice_id in batch.items():
+            try:
+                write_votes({(user_id, question_id): choice_id})
+            except IntegrityError:
+                # retrying cannot succeed
+                logger.exception("Dropped the queued vote of user %s for "
+                                 "choice %s", user_id, choice_id)
+            else:
+                written += 1
+        return written
+
+    def stop(self):
+        '''Stop the worker and write everything still pending'''
+        self._stopping.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join()
+        self.flush()
+
+    def _start_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(
+                    target=self._run, name='vote-buffer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(settings.VOTE_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+
+vote_buffer = VoteBuffer()
+atexit.register(vote_buffer.stop)
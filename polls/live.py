@@ -0,0 +1,186 @@
+'''
+Live results, streamed to the results page as Server-Sent Events.
+
+Each question that is being watched has one ResultsChannel in the process.
+The channel reads the question's results from the results cache when a
+vote is committed in this process (see results_changed) or, for votes
+written by other processes, every LIVE_RESULTS_INTERVAL seconds. When they
+changed it encodes the new snapshot and the delta from the previous one
+once, and every subscriber sends those same bytes.
+
+Subscribers do not queue events. A subscriber that is too slow to keep up
+skips the states it missed and is sent the latest snapshot instead of a
+delta, so a slow client never holds more than one event in memory.
+'''
+import asyncio
+import json
+import logging
+from django.conf import settings
+from django.db import DatabaseError
+from django.core.handlers.asgi import ASGIRequest
+from django.dispatch import receiver
+from .cache import results_cache, results_changed
+from .models import Question
+
+
+logger = logging.getLogger(__name__)
+
+
+def can_stream(request):
+    '''
+    Whether results_stream streams to this request. Only an ASGI server
+    holds an open stream without tying up a worker thread.
+    '''
+    return isinstance(request, ASGIRequest)
+
+
+def encode_event(event, seq, data):
+    '''Encode one Server-Sent Event'''
+    return f'id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def snapshot(rows, total_votes):
+    return {'total_votes': total_votes,
+            'choices': [row._asdict() for row in rows]}
+
+
+def delta(previous_rows, rows, total_votes):
+    '''The choices whose votes or percentage changed'''
+    previous = {row.id: row for row in previous_rows}
+    return {'total_votes': total_votes,
+            'choices': [{'id': row.id, 'votes': row.votes,
+                         'percent': row.percent}
+                        for row in rows if previous.get(row.id) != row]}
+
+
+class Subscriber:
+    '''One connected stream of a channel'''
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.seq = 0
+        self.ready = asyncio.Event()
+
+    async def wait(self, timeout):
+        '''Wait up to timeout seconds for a new event. Return the event'''
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        return self.take()
+
+    def take(self):
+        '''The event that brings this subscriber up to date, if any'''
+        channel = self.channel
+        if channel.seq == self.seq:
+            return None
+        if channel.seq == self.seq + 1:
+            event = channel.delta
+        else:
+            event = channel.snapshot
+        self.seq = channel.seq
+        return event
+
+
+class ResultsChannel:
+    '''The current results of one question and the streams watching it'''
+
+    def __init__(self, question_id):
+        self.question_id = question_id
+        self.subscribers = set()
+        self.state = None
+        self.seq = 0
+        self.snapshot = self.delta = None
+        self.changed = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.task = self.loop.create_task(self.run())
+
+    def notify(self):
+        '''Wake the channel up; safe to call from any thread'''
+        try:
+            self.loop.call_soon_threadsafe(self.changed.set)
+        except RuntimeError:
+            # the loop is closed, so there is nobody left to notify
+            pass
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except DatabaseError:
+                logger.exception("Could not read the results of question %s",
+                                 self.question_id)
+            try:
+                await asyncio.wait_for(self.changed.wait(),
+                                       settings.LIVE_RESULTS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.changed.clear()
+
+    async def refresh(self):
+        '''Publish the question's results if they changed'''
+        rows, total_votes = await results_cache.aresults(
+            Question(pk=self.question_id))
+        if (rows, total_votes) == self.state:
+            return
+        self.seq += 1
+        self.snapshot = encode_event('results', self.seq,
+                                     snapshot(rows, total_votes))
+        if self.state is None:
+            self.delta = self.snapshot
+        else:
+            self.delta = encode_event('delta', self.seq,
+                                      delta(self.state[0], rows, total_votes))
+        self.state = (rows, total_votes)
+        for subscriber in self.subscribers:
+            subscriber.ready.set()
+
+
+class ResultsPublisher:
+    '''The channels of this process, one per watched question'''
+
+    def __init__(self):
+        self.channels = {}
+        self.streams = 0
+
+    def full(self):
+        '''Whether this process serves LIVE_RESULTS_MAX_STREAMS streams'''
+        return self.streams >= settings.LIVE_RESULTS_MAX_STREAMS
+
+    def subscribe(self, question_id):
+        '''Return a Subscriber to the results of question_id'''
+        channel = self.channels.get(question_id)
+        if channel is None:
+            channel = self.channels[question_id] = ResultsChannel(question_id)
+        subscriber = Subscriber(channel)
+        channel.subscribers.add(subscriber)
+        self.streams += 1
+        if channel.seq:
+            subscriber.ready.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        channel = subscriber.channel
+        if subscriber not in channel.subscribers:
+            return
+        channel.subscribers.discard(subscriber)
+        self.streams -= 1
+        if not channel.subscribers:
+            channel.task.cancel()
+            del self.channels[channel.question_id]
+
+    def notify(self, *question_ids):
+        for question_id in question_ids:
+            channel = self.channels.get(question_id)
+            if channel is not None:
+                channel.notify()
+
+
+publisher = ResultsPublisher()
+
+
+@receiver(results_changed)
+def wake_channels(sender, question_ids, **kwargs):
+    '''Push committed votes without waiting for the next poll'''
+    publisher.notify(*question_ids)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+from polls.benchmark import asgi_scope, run_command, summarize, wsgi_load
+from polls.models import Question
+
+
+# (server interface, ASYNC_VIEWS) for each mode
+MODES = {
+    'wsgi': ('wsgi', False),
+    'asgi-sync': ('asgi', False),
+    'asgi': ('asgi', True),
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare requests/s and tail latency of the index, detail and '
+            'results pages served through the WSGI handler with sync '
+            'views, the ASGI handler with sync views, and the ASGI handler '
+            'with async views. Each mode runs in its own process; the '
+            'benchmark question is deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=3000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=100)
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+        # used by the parent process to run a single mode
+        parser.add_argument('--mode', choices=MODES, help='run one mode '
+                            'in this process and print its result as JSON')
+        parser.add_argument('--paths', nargs='+')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            result = self.run_mode(options['mode'], options)
+            self.stdout.write(json.dumps(result))
+            return
+        question = Question.objects.create(
+            question_text='Benchmark question (asgi)')
+        try:
+            for n in range(4):
+                question.choice_set.create(choice_text=f'Choice {n}')
+            paths = [reverse('polls:index'),
+                     reverse('polls:detail', args=(question.id,)),
+                     reverse('polls:results', args=(question.id,))]
+            self.stdout.write(f"{'mode':>10} {'req/s':>8} {'p50':>9} "
+                              f"{'p95':>9} {'p99':>9} {'errors':>7}")
+            for mode in options['modes']:
+                self.report(mode, self.spawn(mode, paths, options))
+        finally:
+            question.delete()
+
+    def spawn(self, mode, paths, options):
+        '''Run mode in a fresh process, which reads ASYNC_VIEWS at start'''
+        args = ['--mode', mode, '--paths', *paths]
+        for option in ('requests', 'concurrency', 'warmup', 'host'):
+            args += [f'--{option}', options[option]]
+        return run_command('bench_asgi', *args,
+                           env={'ASYNC_VIEWS': str(MODES[mode][1])})
+
+    def run_mode(self, mode, options):
+        '''Send the requests and return the throughput and latencies'''
+        paths = options['paths']
+        if MODES[mode][0] == 'wsgi':
+            run = self.run_wsgi
+        else:
+            run = self.run_asgi
+        run(paths, options['warmup'], options, [])
+        statuses = []
+        seconds, latencies = run(paths, options['requests'], options,
+                                 statuses)
+        return {'mode': mode, 'seconds': seconds,
+                'requests_per_second': len(latencies) / seconds,
+                'errors': sum(status >= 400 for status in statuses),
+                **summarize(latencies)}
+
+    def run_wsgi(self, paths, count, options, statuses):
+        '''Call the WSGI handler from a pool of `concurrency` threads'''
+        seconds, latencies, codes = wsgi_load(
+            get_wsgi_application(), paths, count, options['concurrency'],
+            options['host'])
+        statuses.extend(codes)
+        return seconds, latencies
+
+    def run_asgi(self, paths, count, options, statuses):
+        '''Call the ASGI handler with `concurrency` requests in flight'''
+        application = get_asgi_application()
+        latencies = []
+
+        async def request(n, slots):
+            path = paths[n % len(paths)]
+            scope = asgi_scope(path, options['host'])
+            received = False
+            done = asyncio.Event()
+
+            async def receive():
+                nonlocal received
+                if not received:
+                    received = True
+                    return {'type': 'http.request', 'body': b'',
+                            'more_body': False}
+                # the client never disconnects
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif message['type'] == 'http.response.body' and \
+                        not message.get('more_body'):
+                    done.set()
+
+            async with slots:
+                start = time.perf_counter()
+                await application(scope, receive, send)
+                latencies.append(time.perf_counter() - start)
+
+        async def main():
+            slots = asyncio.Semaphore(options['concurrency'])
+            await asyncio.gather(*(request(n, slots) for n in range(count)))
+
+        start = time.perf_counter()
+        asyncio.run(main())
+        return time.perf_counter() - start, latencies
+
+    def report(self, mode, result):
+        self.stdout.write(
+            f"{mode:>10} {result['requests_per_second']:>8.0f} "
+            f"{result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+            f"{result['p99_ms']:>7.2f}ms {result['errors']:>7}")
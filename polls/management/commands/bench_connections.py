@@ -0,0 +1,88 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.urls import reverse
+from polls.benchmark import run_command, summarize, wsgi_load
+from polls.models import Question
+
+
+# environment for each way of managing connections
+MODES = {
+    'per-request': {'DATABASE_POOL': 'False', 'DATABASE_CONN_MAX_AGE': '0'},
+    'persistent': {'DATABASE_POOL': 'False', 'DATABASE_CONN_MAX_AGE': '60'},
+    'pool': {'DATABASE_POOL': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare connections opened, requests/s and latency of the '
+            'detail and results pages with a new connection per request, '
+            'persistent connections and a connection pool, at growing '
+            'numbers of concurrent requests. Each run uses a fresh process; '
+            'the benchmark question is deleted afterwards. PostgreSQL only.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[1, 8, 32])
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+        # used by the parent process to run a single mode
+        parser.add_argument('--paths', nargs='+',
+                            help='request these paths in this process and '
+                            'print the result as JSON')
+
+    def handle(self, *args, **options):
+        if options['paths']:
+            seconds, latencies, statuses = wsgi_load(
+                get_wsgi_application(), options['paths'],
+                options['requests'], options['concurrency'][0],
+                options['host'])
+            self.stdout.write(json.dumps({
+                'requests_per_second': len(latencies) / seconds,
+                'errors': sum(status >= 400 for status in statuses),
+                **summarize(latencies)}))
+            return
+        if connection.vendor != 'postgresql':
+            raise CommandError('bench_connections needs PostgreSQL')
+        question = Question.objects.create(
+            question_text='Benchmark question (connections)')
+        try:
+            for n in range(4):
+                question.choice_set.create(choice_text=f'Choice {n}')
+            paths = [reverse('polls:detail', args=(question.id,)),
+                     reverse('polls:results', args=(question.id,))]
+            self.stdout.write(f"{'mode':>12} {'threads':>7} {'sessions':>8} "
+                              f"{'req/s':>7} {'p50':>9} {'p99':>9} "
+                              f"{'errors':>6}")
+            for concurrency in options['concurrency']:
+                for mode in options['modes']:
+                    self.run(mode, concurrency, paths, options)
+        finally:
+            question.delete()
+
+    def run(self, mode, concurrency, paths, options):
+        before = self.sessions()
+        result = run_command(
+            'bench_connections', '--requests', options['requests'],
+            '--concurrency', concurrency, '--host', options['host'],
+            '--paths', *paths, env=MODES[mode])
+        sessions = self.sessions() - before
+        self.stdout.write(
+            f"{mode:>12} {concurrency:>7} {sessions:>8} "
+            f"{result['requests_per_second']:>7.0f} "
+            f"{result['p50_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms "
+            f"{result['errors']:>6}")
+
+    def sessions(self):
+        '''Sessions opened on this database so far, as counted by the server'''
+        # the server publishes its counters with a short delay
+        time.sleep(1)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_stat_clear_snapshot()')
+            cursor.execute('SELECT sessions FROM pg_stat_database '
+                           'WHERE datname = current_database()')
+            return cursor.fetchone()[0]
@@ -0,0 +1,63 @@
+import datetime
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+from polls.benchmark import measure, rolled_back
+from polls.models import Question, Choice
+from polls.views import IndexView
+
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Measure IndexView latency against growing numbers of '
+            'questions. Data is created in a transaction that is rolled '
+            'back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[100, 1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'questions':>10} {'query p50':>10} "
+                          f"{'query p99':>10} {'page p50':>10} "
+                          f"{'page p99':>10}")
+        for size in options['sizes']:
+            with rolled_back():
+                self.create_questions(size)
+                query = measure(lambda: list(IndexView().get_queryset()),
+                                options['repeat'])
+                page = measure(self.render_index, options['repeat'])
+            self.stdout.write(f"{size:>10} {query['p50_ms']:>8.2f}ms "
+                              f"{query['p99_ms']:>8.2f}ms "
+                              f"{page['p50_ms']:>8.2f}ms "
+                              f"{page['p99_ms']:>8.2f}ms")
+
+    def create_questions(self, size):
+        '''
+        Create `size` questions spread over the last year; one in ten is
+        not published yet and one in ten has a single choice.
+        '''
+        now = timezone.now()
+        for start in range(0, size, BATCH_SIZE):
+            questions = []
+            for n in range(start, min(size, start + BATCH_SIZE)):
+                offset = datetime.timedelta(minutes=n % 525600)
+                pub_date = now + offset if n % 10 == 0 else now - offset
+                questions.append(Question(question_text=f'Question {n}',
+                                          pub_date=pub_date))
+            questions = Question.objects.bulk_create(questions)
+            choices = []
+            for n, question in enumerate(questions, start):
+                for c in range(1 if n % 10 == 1 else 2):
+                    choices.append(Choice(question=question,
+                                          choice_text=f'Choice {c}'))
+            Choice.objects.bulk_create(choices)
+
+    def render_index(self):
+        request = RequestFactory().get('/polls/')
+        request.user = AnonymousUser()
+        IndexView.as_view()(request).render()
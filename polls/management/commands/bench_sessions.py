@@ -0,0 +1,76 @@
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from polls.benchmark import CLIENT_ADDR, rolled_back, summarize
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    help = ('Count the session queries and time the vote and results '
+            'requests of logged in users with each SESSION_STORE. Data is '
+            'created in a transaction that is rolled back afterwards; votes '
+            'are recorded synchronously so that they are rolled back too.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--votes', type=int, default=200)
+        parser.add_argument('--voters', type=int, default=20)
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'store':>14} {'request':>8} {'session q':>9} "
+                          f"{'queries':>7} {'p50':>9}")
+        for store, engine in settings.SESSION_ENGINES.items():
+            with rolled_back(), override_settings(SESSION_ENGINE=engine,
+                                                  VOTE_INGESTION='sync'):
+                results = self.run(store, options)
+            for request, result in results.items():
+                self.stdout.write(
+                    f"{store:>14} {request:>8} "
+                    f"{result['session_queries']:>9.2f} "
+                    f"{result['queries']:>7.2f} {result['p50_ms']:>7.2f}ms")
+
+    def run(self, store, options):
+        '''Per-request session queries, queries and latency of one store'''
+        question = Question.objects.create(question_text='Benchmark question',
+                                           pub_date=timezone.now())
+        choices = [question.choice_set.create(choice_text=f'Choice {n}').pk
+                   for n in range(4)]
+        voters = []
+        for n in range(options['voters']):
+            voter = Client(HTTP_HOST=options['host'], REMOTE_ADDR=CLIENT_ADDR)
+            voter.force_login(
+                User.objects.create_user(f'bench-{store}-{n}'))
+            voters.append(voter)
+        vote_url = reverse('polls:vote', args=(question.pk,))
+        results_url = reverse('polls:results', args=(question.pk,))
+        measured = {'vote': [], 'results': []}
+        for n in range(options['votes']):
+            voter = voters[n % len(voters)]
+            measured['vote'].append(self.measure(
+                lambda: voter.post(vote_url,
+                                   {'choice': choices[n % len(choices)]})))
+            measured['results'].append(self.measure(
+                lambda: voter.get(results_url)))
+        return {request: {
+            'session_queries': sum(s for s, _, _ in samples) / len(samples),
+            'queries': sum(q for _, q, _ in samples) / len(samples),
+            'p50_ms': summarize([t for _, _, t in samples])['p50_ms'],
+        } for request, samples in measured.items()}
+
+    @staticmethod
+    def measure(request):
+        '''(session queries, queries, seconds) of one request'''
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            request()
+            seconds = time.perf_counter() - start
+        sqls = [query['sql'] for query in queries
+                if 'SAVEPOINT' not in query['sql']]
+        return (sum('django_session' in sql for sql in sqls), len(sqls),
+                seconds)
@@ -0,0 +1,130 @@
+import asyncio
+import resource
+import time
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+from polls.benchmark import asgi_scope, summarize
+from polls.cache import results_cache
+from polls.live import publisher
+from polls.models import Question, Vote
+
+
+class Stream:
+    '''One client of the live results stream, driven through ASGI'''
+
+    def __init__(self, bench):
+        self.bench = bench
+        self.last_id = None
+        self.connected = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.received = False
+
+    async def receive(self):
+        if not self.received:
+            self.received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] != 'http.response.body':
+            return
+        for line in message.get('body', b'').splitlines():
+            if line.startswith(b'id: '):
+                self.last_id = int(line[4:])
+                self.connected.set()
+                self.bench.delivered(self)
+
+
+class Command(BaseCommand):
+    help = ('Hold many live results streams open on one ASGI application '
+            'in this process, cast votes, and report how long the deltas '
+            'take to reach every stream and how many results queries the '
+            'publisher ran. The benchmark question and users are deleted '
+            'afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=2000)
+        parser.add_argument('--votes', type=int, default=20)
+        parser.add_argument('--pause', type=float, default=0.2,
+                            help='seconds between votes')
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        question = Question.objects.create(
+            question_text='Benchmark question (streams)')
+        users = User.objects.bulk_create(
+            [User(username=f'bench-watcher-{n}')
+             for n in range(options['votes'])])
+        try:
+            for n in range(4):
+                question.choice_set.create(choice_text=f'Choice {n}')
+            # no stream may close for being idle during the run
+            with override_settings(LIVE_RESULTS_MAX_STREAMS=options['streams'],
+                                   LIVE_RESULTS_IDLE_TIMEOUT=3600):
+                asyncio.run(self.run(question, users, options))
+        finally:
+            question.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    async def run(self, question, users, options):
+        application = get_asgi_application()
+        path = reverse('polls:results_stream', args=(question.id,))
+        scope = asgi_scope(path, options['host'])
+        self.round = None
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        streams = [Stream(self) for _ in range(options['streams'])]
+        tasks = [asyncio.create_task(application(dict(scope), stream.receive,
+                                                 stream.send))
+                 for stream in streams]
+        await asyncio.gather(*(stream.connected.wait() for stream in streams))
+        connect_seconds = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f"{len(streams)} streams connected in {connect_seconds:.2f}s, "
+            f"{publisher.streams} served, {len(publisher.channels)} channel, "
+            f"peak RSS +{(rss_after - rss_before) / 1024:.1f}MB")
+
+        choices = [choice async for choice in question.choice_set.all()]
+        misses = results_cache.stats()['misses']
+        latencies = []
+        for n, user in enumerate(users):
+            self.round = {'streams': set(), 'latencies': latencies,
+                          'done': asyncio.Event(), 'total': len(streams),
+                          'start': time.perf_counter()}
+            await sync_to_async(Vote.objects.cast)(user,
+                                                   choices[n % len(choices)])
+            try:
+                await asyncio.wait_for(self.round['done'].wait(), 10)
+            except asyncio.TimeoutError:
+                self.stderr.write(f"vote {n}: only "
+                                  f"{len(self.round['streams'])} streams "
+                                  f"got the delta")
+            self.round = None
+            await asyncio.sleep(options['pause'])
+        queries = results_cache.stats()['misses'] - misses
+
+        for stream in streams:
+            stream.disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stats = summarize(latencies)
+        self.stdout.write(
+            f"{len(users)} votes, {stats['count']} deltas delivered, "
+            f"{queries} results queries; delivery p50 "
+            f"{stats['p50_ms']:.2f}ms, p99 {stats['p99_ms']:.2f}ms; "
+            f"{publisher.streams} streams left open")
+
+    def delivered(self, stream):
+        '''Record when the delta of the current vote reached stream'''
+        current = self.round
+        if current is None or stream in current['streams']:
+            return
+        current['streams'].add(stream)
+        current['latencies'].append(time.perf_counter() - current['start'])
+        if len(current['streams']) == current['total']:
+            current['done'].set()
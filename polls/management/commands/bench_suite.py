@@ -0,0 +1,180 @@
+import json
+import subprocess
+import time
+from contextlib import ExitStack
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q, Sum
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from polls.benchmark import CLIENT_ADDR, regressions, rolled_back, summarize
+from polls.datasets import generate
+from polls.models import Question, Vote
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the index, detail, results and vote endpoints '
+            'through the test client against a generated dataset, or the '
+            'data already in the database with --existing, and write '
+            'latency percentiles, requests/s and query counts per endpoint '
+            'as JSON. With --baseline, fail if an endpoint got slower or '
+            'runs more queries than in an earlier run. Data is created in '
+            'a transaction that is rolled back afterwards; votes are '
+            'recorded synchronously so that they are rolled back too.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--questions', type=int, default=1000)
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--votes', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--existing', action='store_true',
+                            help='benchmark the questions in the database '
+                            'instead of generating a dataset')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--voters', type=int, default=20)
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--output', default='bench-results.json')
+        parser.add_argument('--baseline',
+                            help='results of an earlier run to compare to')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='p95 growth allowed over the baseline')
+
+    def handle(self, *args, **options):
+        with rolled_back(), override_settings(VOTE_INGESTION='sync'):
+            if not options['existing']:
+                generate(options['users'], options['questions'],
+                         options['choices'], options['votes'],
+                         seed=options['seed'])
+            requests = self.requests(options)
+            endpoints = {name: self.run(clients, requests[name], options)
+                         for name, clients in self.clients(options).items()}
+            dataset = {'users': User.objects.count(),
+                       'questions': Question.objects.count(),
+                       'votes': Vote.objects.count()}
+        report = {
+            'created': timezone.now().isoformat(),
+            'commit': self.commit(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'async_views': settings.ASYNC_VIEWS,
+            'dataset': dataset,
+            'requests': options['requests'],
+            'endpoints': endpoints,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(f"{'endpoint':>8} {'req/s':>7} {'p50':>9} "
+                          f"{'p95':>9} {'p99':>9} {'queries':>7} "
+                          f"{'errors':>6}")
+        for name, result in endpoints.items():
+            self.stdout.write(
+                f"{name:>8} {result['requests_per_second']:>7.0f} "
+                f"{result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+                f"{result['p99_ms']:>7.2f}ms {result['queries_max']:>7} "
+                f"{result['errors']:>6}")
+        self.stdout.write(f"Wrote {options['output']}")
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                found = regressions(endpoints,
+                                    json.load(baseline)['endpoints'],
+                                    options['tolerance'])
+            if found:
+                raise CommandError('Regressions against '
+                                   f"{options['baseline']}:\n"
+                                   + '\n'.join(found))
+            self.stdout.write(self.style.SUCCESS(
+                f"No regressions against {options['baseline']}"))
+
+    def requests(self, options):
+        '''
+        (method, path, data) to cycle through for each endpoint: the most
+        voted open question, then a sample of the other open questions.
+        '''
+        now = timezone.now()
+        open_questions = Question.objects.published() \
+            .with_choices(minimum=2) \
+            .filter(Q(end_date__isnull=True) | Q(end_date__gte=now)) \
+            .annotate(total=Sum('choice__vote_count'))
+        hot = open_questions.order_by('-total', 'pk').first()
+        if hot is None:
+            raise CommandError('No open question with two or more choices '
+                               'to benchmark')
+        sample = [hot, *open_questions.exclude(pk=hot.pk).order_by('?')[:9]]
+        choices = {question.pk: list(question.choice_set
+                                     .values_list('pk', flat=True))
+                   for question in sample}
+        # half the requests go to the hot question
+        targets = [question for other in sample[1:]
+                   for question in (hot, other)] or [hot]
+        return {
+            'index': [('get', reverse('polls:index'), None)],
+            'detail': [('get', reverse('polls:detail', args=(q.pk,)), None)
+                       for q in targets],
+            'results': [('get', reverse('polls:results', args=(q.pk,)), None)
+                        for q in targets],
+            'vote': [('post', reverse('polls:vote', args=(q.pk,)),
+                      {'choice': choices[q.pk][n % len(choices[q.pk])]})
+                     for n, q in enumerate(targets)],
+        }
+
+    def clients(self, options):
+        '''Test clients for each endpoint; logged in voters for votes'''
+        def client():
+            return Client(HTTP_HOST=options['host'], REMOTE_ADDR=CLIENT_ADDR)
+
+        voters = []
+        for n in range(options['voters']):
+            voter = client()
+            voter.force_login(User.objects.create_user(f'bench-voter-{n}'))
+            voters.append(voter)
+        anonymous = [client()]
+        return {'index': anonymous, 'detail': anonymous,
+                'results': anonymous, 'vote': voters}
+
+    def run(self, clients, requests, options):
+        '''Send the requests in turn and summarize their latency'''
+        def send(n):
+            method, path, data = requests[n % len(requests)]
+            client = clients[n % len(clients)]
+            return getattr(client, method)(path, data)
+
+        for n in range(options['warmup']):
+            send(n)
+        latencies, queries, errors = [], [], 0
+        start = time.perf_counter()
+        for n in range(options['requests']):
+            with ExitStack() as stack:
+                captured = [stack.enter_context(
+                                CaptureQueriesContext(connections[alias]))
+                            for alias in (DEFAULT_DB_ALIAS,
+                                          *settings.DATABASE_REPLICAS)]
+                started = time.perf_counter()
+                response = send(n)
+                latencies.append(time.perf_counter() - started)
+            queries.append(sum(len(capture) for capture in captured))
+            errors += response.status_code >= 400
+        seconds = time.perf_counter() - start
+        return {
+            **summarize(latencies),
+            'requests_per_second': len(latencies) / seconds,
+            'queries_mean': sum(queries) / len(queries) if queries else 0,
+            'queries_max': max(queries, default=0),
+            'errors': errors,
+        }
+
+    def commit(self):
+        '''The git commit being benchmarked, if known'''
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                check=True, capture_output=True, text=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,84 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from polls.benchmark import CLIENT_ADDR, measure, rolled_back, summarize
+from polls.models import Question
+from polls.warmup import warm_templates
+
+
+def reset_templates():
+    '''Empty the cached template loaders, as in a freshly started process'''
+    for backend in engines.all():
+        if hasattr(backend, 'engine'):
+            for loader in backend.engine.template_loaders:
+                loader.reset()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ('Measure the median first request to each page in a process '
+            'whose templates are not compiled yet, the first request after '
+            'warm_templates(), and the steady state. Data is created in a '
+            'transaction that is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--restarts', type=int, default=20,
+                            help='first requests measured per page')
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            question = Question.objects.create(
+                question_text='Benchmark question', pub_date=timezone.now())
+            for n in range(4):
+                question.choice_set.create(choice_text=f'Choice {n}')
+            user = User.objects.create_user('bench-templates')
+            anonymous = Client(HTTP_HOST=options['host'],
+                               REMOTE_ADDR=CLIENT_ADDR)
+            voter = Client(HTTP_HOST=options['host'], REMOTE_ADDR=CLIENT_ADDR)
+            voter.force_login(user)
+            pages = {
+                'index': (anonymous, reverse('polls:index')),
+                'detail': (voter, reverse('polls:detail',
+                                          args=(question.pk,))),
+                'results': (anonymous, reverse('polls:results',
+                                               args=(question.pk,))),
+                'login': (anonymous, reverse('login')),
+                'signup': (anonymous, reverse('signup')),
+                'admin login': (anonymous, reverse('admin:login')),
+            }
+            # URL resolution, middleware and connections are set up before
+            # any page is measured
+            anonymous.get('/')
+            voter.get('/')
+            self.stdout.write(f"{'page':>12} {'cold':>9} {'warmed':>9} "
+                              f"{'steady p50':>10}")
+            for name, (client, url) in pages.items():
+                def get():
+                    client.get(url)
+
+                # fill the page and results caches, so that only the
+                # templates differ between the measurements
+                get()
+                cold, warmed = [], []
+                for _ in range(options['restarts']):
+                    reset_templates()
+                    cold.append(timed(get))
+                    reset_templates()
+                    warm_templates()
+                    warmed.append(timed(get))
+                cold = summarize(cold)['p50_ms']
+                warmed = summarize(warmed)['p50_ms']
+                steady = measure(get, options['repeat'])['p50_ms']
+                self.stdout.write(f'{name:>12} {cold:>7.2f}ms '
+                                  f'{warmed:>7.2f}ms {steady:>8.2f}ms')
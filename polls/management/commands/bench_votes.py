@@ -0,0 +1,93 @@
+import threading
+import time
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from polls.benchmark import summarize
+from polls.ingestion import vote_buffer
+from polls.models import Question
+from polls.views import vote
+
+
+class Command(BaseCommand):
+    help = ('Compare vote throughput of the synchronous and queued '
+            'ingestion modes by driving the vote view from several '
+            'threads. The benchmark users and questions are deleted '
+            'afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--votes', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--flush-interval', type=float, default=0.5)
+
+    def handle(self, *args, **options):
+        users = User.objects.bulk_create(
+            [User(username=f'bench-voter-{n}')
+             for n in range(options['users'])])
+        questions = []
+        try:
+            for mode in ('sync', 'queued'):
+                question = Question.objects.create(
+                    question_text=f'Benchmark question ({mode})')
+                questions.append(question)
+                for n in range(4):
+                    question.choice_set.create(choice_text=f'Choice {n}')
+                with override_settings(
+                        VOTE_INGESTION=mode,
+                        VOTE_BATCH_SIZE=options['batch_size'],
+                        VOTE_FLUSH_INTERVAL=options['flush_interval']):
+                    self.report(mode, *self.run(question, users, options))
+        finally:
+            for question in questions:
+                question.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run(self, question, users, options):
+        '''Cast the votes and return (seconds, request latencies)'''
+        choices = list(question.choice_set.all())
+        url = reverse('polls:vote', args=(question.id,))
+        factory = RequestFactory()
+        per_thread = options['votes'] // options['threads']
+        latencies = []
+        barrier = threading.Barrier(options['threads'] + 1)
+
+        def worker(n):
+            samples = []
+            try:
+                barrier.wait()
+                for i in range(per_thread):
+                    number = n * per_thread + i
+                    request = factory.post(url, {
+                        'choice': choices[number % len(choices)].id})
+                    request.user = users[number % len(users)]
+                    request._messages = CookieStorage(request)
+                    start = time.perf_counter()
+                    vote(request, question.id)
+                    samples.append(time.perf_counter() - start)
+            finally:
+                latencies.extend(samples)
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,))
+                   for n in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        # queued votes only count once they are in the database
+        vote_buffer.stop()
+        return time.perf_counter() - start, latencies
+
+    def report(self, mode, seconds, latencies):
+        stats = summarize(latencies)
+        self.stdout.write(
+            f"{mode:>7}: {stats['count'] / seconds:8.0f} votes/s "
+            f"(request p50 {stats['p50_ms']:.2f}ms, "
+            f"p99 {stats['p99_ms']:.2f}ms, total {seconds:.2f}s)")
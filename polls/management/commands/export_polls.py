@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from polls.export import CONTENT_TYPES, EXPORTS, export
+
+
+class Command(BaseCommand):
+    help = ('Stream per-question results or raw votes as CSV or NDJSON, '
+            'to stdout or a file, in constant memory.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORTS)
+        parser.add_argument('--format', choices=CONTENT_TYPES, default='csv')
+        parser.add_argument('--question', type=int, nargs='+',
+                            help='only export these question ids')
+        parser.add_argument('--output', help='file to write instead of '
+                            'stdout')
+
+    def handle(self, *args, **options):
+        chunks = export(options['kind'], options['format'],
+                        options['question'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
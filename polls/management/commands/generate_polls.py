@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from polls.datasets import DATASET_PREFIX, delete_dataset, generate
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic dataset of users, questions, choices and '
+            'votes for load testing, with a few hot questions drawing most '
+            f'of the votes. Generated rows are named "{DATASET_PREFIX}..." '
+            'and removed with --delete, which deletes only what was '
+            'generated. Generated users have no usable password.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--questions', type=int, default=1000)
+        parser.add_argument('--choices', type=int, default=4,
+                            help='choices per question')
+        parser.add_argument('--votes', type=int, default=100000)
+        parser.add_argument('--hot-fraction', type=float, default=0.05,
+                            help='fraction of the questions that are hot')
+        parser.add_argument('--hot-share', type=float, default=0.8,
+                            help='fraction of the votes the hot questions '
+                            'get')
+        parser.add_argument('--seed', type=int,
+                            help='seed for a repeatable dataset')
+        parser.add_argument('--delete', action='store_true',
+                            help='delete the generated dataset instead')
+
+    def handle(self, *args, **options):
+        if options['delete']:
+            deleted = delete_dataset()
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {deleted} generated questions.'))
+            return
+        start = time.perf_counter()
+        users, questions = generate(
+            options['users'], options['questions'], options['choices'],
+            options['votes'], options['hot_fraction'], options['hot_share'],
+            options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users and {len(questions)} questions '
+            f'in {time.perf_counter() - start:.1f}s.'))
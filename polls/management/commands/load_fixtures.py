@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from polls.cache import bump_polls_version
+from polls.fixtures import FIXTURE_BATCH_SIZE, load_fixture
+from polls.state import poll_state
+
+
+class Command(BaseCommand):
+    help = ('Load JSON fixtures with batched inserts, skipping objects that '
+            'are already in the database. Unlike loaddata, objects that '
+            'exist are not overwritten. Run rebuild_vote_counts after '
+            'loading votes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', nargs='+',
+                            help='paths of JSON fixture files')
+        parser.add_argument('--batch-size', type=int,
+                            default=FIXTURE_BATCH_SIZE)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        # one transaction, so fixtures may refer to objects in later ones
+        with transaction.atomic(using=using):
+            for path in options['fixtures']:
+                with open(path, encoding='utf-8') as stream:
+                    counts = load_fixture(stream, using,
+                                          options['batch_size'])
+                read = sum(read for read, inserted in counts.values())
+                inserted = sum(inserted for read, inserted in counts.values())
+                self.stdout.write(f'{path}: {inserted} of {read} objects '
+                                  'inserted')
+        # bulk inserts send no signals to invalidate these
+        poll_state.invalidate()
+        bump_polls_version(generation=True)
+        self.stdout.write(self.style.SUCCESS('Fixtures loaded.'))
@@ -0,0 +1,51 @@
+import statistics
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from polls.benchmark import startup
+
+
+class Command(BaseCommand):
+    help = ('Time how long a fresh process takes to import the application '
+            'and the URLconf, as a server worker does before its first '
+            'request, and list the packages and modules that take longest '
+            'to import (from python -X importtime). Fail if the median '
+            'startup is slower than --target-ms.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=settings.WSGI_APPLICATION
+                            .rsplit('.', 1)[0],
+                            help='application module to import')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--target-ms', type=float,
+                            default=settings.STARTUP_TARGET_MS)
+
+    def handle(self, *args, **options):
+        module = options['module']
+        median = statistics.median(startup(module)[0]
+                                   for _ in range(options['repeat'])) * 1000
+        _, times = startup(module, importtime=True)
+        packages = {}
+        for name, (own, _) in times.items():
+            package = name.split('.')[0]
+            total, count = packages.get(package, (0, 0))
+            packages[package] = (total + own, count + 1)
+        top = options['top']
+        self.stdout.write(f"{'package':<30} {'self':>9} {'modules':>7}")
+        for package, (own, count) in sorted(
+                packages.items(), key=lambda item: -item[1][0])[:top]:
+            self.stdout.write(f'{package:<30} {own / 1000:>7.1f}ms '
+                              f'{count:>7}')
+        self.stdout.write('')
+        self.stdout.write(f"{'module':<50} {'self':>9} {'cumulative':>10}")
+        for name, (own, cumulative) in sorted(
+                times.items(), key=lambda item: -item[1][0])[:top]:
+            self.stdout.write(f'{name:<50} {own / 1000:>7.1f}ms '
+                              f'{cumulative / 1000:>8.1f}ms')
+        self.stdout.write('')
+        summary = (f'Startup of {module}: {median:.0f}ms median of '
+                   f"{options['repeat']} runs, target "
+                   f"{options['target_ms']:.0f}ms")
+        if median > options['target_ms']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
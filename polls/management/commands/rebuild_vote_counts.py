@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from polls.cache import results_cache
+from polls.models import Choice, Vote
+
+
+class Command(BaseCommand):
+    help = 'Recount Choice.vote_count from the Vote table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--question', type=int, action='append',
+                            help='Only rebuild choices of this question id '
+                                 '(may be given more than once).')
+
+    def handle(self, *args, **options):
+        counts = Vote.objects.filter(choice=OuterRef('pk')) \
+            .order_by().values('choice') \
+            .annotate(total=Count('pk')).values('total')
+        choices = Choice.objects.all()
+        if options['question']:
+            choices = choices.filter(question__in=options['question'])
+        with transaction.atomic():
+            updated = choices.update(
+                vote_count=Coalesce(Subquery(counts), Value(0)))
+            results_cache.invalidate(
+                *choices.order_by().values_list('question', flat=True)
+                .distinct())
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt vote counts for {updated} choices.'))
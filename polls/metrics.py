@@ -0,0 +1,243 @@
+'''
+In-process request metrics in the Prometheus text format.
+
+MetricsMiddleware counts every request and observes its latency. A
+METRICS_SAMPLE_RATE fraction of requests is also instrumented in detail:
+the number and total time of their database queries, through an
+execute_wrapper() on every database connection, and the time spent
+rendering templates. Every server process keeps its own metrics, so
+Prometheus should scrape each process, as it would any multi-process
+server.
+'''
+import threading
+import time
+from contextvars import ContextVar
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+from .cache import results_cache
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    '''Cumulative bucket counts, sum and count of observed values'''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[n] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        '''(le, cumulative count) for each bucket, then +Inf'''
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield format_value(bound), total
+        yield '+Inf', self.count
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape(value)}"'
+                    for name, value in labels.items())
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+class Sample:
+    '''What the detailed instrumentation of one request measured'''
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+        self.rendering = False
+
+
+_sample = ContextVar('polls_metrics_sample', default=None)
+
+
+class RequestMetrics:
+    '''Thread-safe per-view request metrics of this process'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}
+            self.latency = {}
+            self.sampled = {}
+            self.queries = {}
+            self.query_seconds = {}
+            self.template_seconds = {}
+
+    def observe(self, view, method, status, seconds, sample=None):
+        '''Record one request, with its Sample if it was instrumented'''
+        with self._lock:
+            key = (view, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._histogram(self.latency, view, LATENCY_BUCKETS) \
+                .observe(seconds)
+            if sample is None:
+                return
+            self.sampled[view] = self.sampled.get(view, 0) + 1
+            self._histogram(self.queries, view, QUERY_COUNT_BUCKETS) \
+                .observe(sample.queries)
+            self._histogram(self.query_seconds, view, LATENCY_BUCKETS) \
+                .observe(sample.query_seconds)
+            self._histogram(self.template_seconds, view, LATENCY_BUCKETS) \
+                .observe(sample.template_seconds)
+
+    @staticmethod
+    def _histogram(histograms, view, buckets):
+        if view not in histograms:
+            histograms[view] = Histogram(buckets)
+        return histograms[view]
+
+    def exposition(self):
+        '''The metrics in the Prometheus text exposition format'''
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histograms(name, help_text, histograms):
+            family(name, 'histogram', help_text)
+            for view, histogram in sorted(histograms.items()):
+                for le, count in histogram.samples():
+                    labels = format_labels({'view': view, 'le': le})
+                    lines.append(f'{name}_bucket{{{labels}}} {count}')
+                labels = format_labels({'view': view})
+                lines.append(f'{name}_sum{{{labels}}} '
+                             f'{format_value(histogram.sum)}')
+                lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+        with self._lock:
+            family('polls_http_requests_total', 'counter',
+                   'Requests handled, by view, method and status.')
+            for (view, method, status), count in sorted(
+                    self.requests.items()):
+                labels = format_labels({'view': view, 'method': method,
+                                        'status': status})
+                lines.append(f'polls_http_requests_total{{{labels}}} '
+                             f'{count}')
+            histograms('polls_http_request_duration_seconds',
+                       'Time to produce the response.', self.latency)
+            family('polls_http_sampled_requests_total', 'counter',
+                   'Requests instrumented in detail, by view.')
+            for view, count in sorted(self.sampled.items()):
+                labels = format_labels({'view': view})
+                lines.append(f'polls_http_sampled_requests_total'
+                             f'{{{labels}}} {count}')
+            histograms('polls_db_queries_per_request',
+                       'Database queries per sampled request.',
+                       self.queries)
+            histograms('polls_db_query_duration_seconds',
+                       'Database time per sampled request.',
+                       self.query_seconds)
+            histograms('polls_template_render_duration_seconds',
+                       'Template rendering time per sampled request.',
+                       self.template_seconds)
+        stats = results_cache.stats()
+        for name in ('hits', 'misses'):
+            family(f'polls_results_cache_{name}_total', 'counter',
+                   f'Results cache {name} of this process.')
+            lines.append(f'polls_results_cache_{name}_total {stats[name]}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+def current_sample():
+    '''The Sample of the request being instrumented, if any'''
+    return _sample.get()
+
+
+def start_sample():
+    '''Instrument the current request; return (sample, token to reset)'''
+    sample = Sample()
+    return sample, _sample.set(sample)
+
+
+def stop_sample(token):
+    _sample.reset(token)
+
+
+def time_query(execute, sql, params, many, context):
+    '''execute_wrapper() adding each query to the request's Sample'''
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.query_seconds += time.perf_counter() - start
+
+
+def instrument_queries():
+    '''
+    Add time_query to the database connections of every thread, for good.
+    Async views run their queries on sync_to_async threads, not on the
+    thread that starts the sample, so a wrapper entered only around the
+    request would miss them; the sample is found through the context,
+    which sync_to_async carries over to the thread.
+    '''
+    for connection in connections.all(initialized_only=True):
+        add_query_timer(connection)
+    # each thread opens its own connections
+    connection_created.connect(add_query_timer,
+                               dispatch_uid='polls_metrics_time_query')
+
+
+def add_query_timer(connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def instrument_templates():
+    '''
+    Time the top-level renders of Django templates, the ones made by
+    render(), render_to_string() and TemplateResponse, for sampled
+    requests. Included templates are part of their parent's time.
+    '''
+    if getattr(Template.render, 'instrumented', False):
+        return
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        sample = _sample.get()
+        if sample is None or sample.rendering:
+            return render(self, context, request)
+        sample.rendering = True
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            sample.template_seconds += time.perf_counter() - start
+            sample.rendering = False
+    timed_render.instrumented = True
+    Template.render = timed_render
@@ -0,0 +1,64 @@
+import random
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .metrics import (instrument_queries, instrument_templates,
+                      request_metrics, start_sample, stop_sample)
+
+
+class MetricsMiddleware:
+    '''
+    Record the latency of every request, and the database and template
+    time of a METRICS_SAMPLE_RATE fraction of them, in request_metrics.
+    Put it early in MIDDLEWARE so that it times the other middleware too;
+    only the middleware answering static file requests comes before it.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        instrument_queries()
+        instrument_templates()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            self.observe(request, response, start)
+            return response
+        with ExitStack() as stack:
+            sample = self.sample(stack)
+            response = self.get_response(request)
+        self.observe(request, response, start, sample)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            response = await self.get_response(request)
+            self.observe(request, response, start)
+            return response
+        with ExitStack() as stack:
+            sample = self.sample(stack)
+            response = await self.get_response(request)
+        self.observe(request, response, start, sample)
+        return response
+
+    def sample(self, stack):
+        '''Instrument the request until stack exits; return its Sample'''
+        sample, token = start_sample()
+        stack.callback(stop_sample, token)
+        return sample
+
+    def observe(self, request, response, start, sample=None):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        request_metrics.observe(view, request.method, response.status_code,
+                                time.perf_counter() - start, sample)
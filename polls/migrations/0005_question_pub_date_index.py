@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0004_choice_vote_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['pub_date'], name='polls_question_pub_date'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def copy_question_and_dedupe(apps, schema_editor):
+    '''
+    Fill Vote.question from the vote's choice, then keep only the latest
+    vote of each user on each question and recount the tallies.
+    '''
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    Vote.objects.update(question=Subquery(
+        Choice.objects.filter(pk=OuterRef('choice')).values('question')))
+    latest = Vote.objects.order_by().values('user', 'question') \
+        .annotate(latest=Max('pk')).values('latest')
+    Vote.objects.exclude(pk__in=latest).delete()
+    counts = Vote.objects.filter(choice=OuterRef('pk')) \
+        .order_by().values('choice') \
+        .annotate(total=Count('pk')).values('total')
+    Choice.objects.update(vote_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_question_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.RunPython(copy_question_and_dedupe,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_vote_one_per_question'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='choice',
+            name='question',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.AlterField(
+            model_name='vote',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='choice',
+            index=models.Index(fields=['question', 'id'], name='polls_choice_question_id'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('end_date__isnull', False)), fields=['end_date'], name='polls_question_end_date'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:41
+
+import polls.cache
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_dataset_member'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollsVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(default=polls.cache.new_token, max_length=32)),
+                ('generation', models.CharField(default=polls.cache.new_token, max_length=32)),
+            ],
+        ),
+    ]
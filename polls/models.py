@@ -1,13 +1,51 @@
 import datetime
 from django.utils import timezone
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib import admin
 from django.utils.timezone import now
 from django.contrib.auth.models import User
+from .cache import bump_polls_version, new_token, results_cache
+from .results import format_percent
+from .state import poll_state
 
 
 # Create your models here.
 
+class QuestionQuerySet(models.QuerySet):
+    '''Database-side versions of the Question checks used by the views'''
+
+    def published(self):
+        '''Questions past their publication time'''
+        return self.filter(pub_date__lte=timezone.now())
+
+    def with_choices(self, minimum=2):
+        '''Questions with at least `minimum` choices'''
+        choice_count = Choice.objects.filter(question=OuterRef('pk')) \
+            .order_by().values('question') \
+            .annotate(total=Count('pk')).values('total')
+        return self.annotate(num_choices=Subquery(choice_count)) \
+            .filter(num_choices__gte=minimum)
+
+    def next_transition(self, now):
+        '''The next pub_date or end_date after now, or None'''
+        next_pub = self.filter(pub_date__gt=now).order_by('pub_date') \
+            .values_list('pub_date', flat=True).first()
+        next_end = self.filter(end_date__gte=now).order_by('end_date') \
+            .values_list('end_date', flat=True).first()
+        return min(filter(None, (next_pub, next_end)), default=None)
+
+    async def anext_transition(self, now):
+        '''Async version of next_transition()'''
+        next_pub = await self.filter(pub_date__gt=now).order_by('pub_date') \
+            .values_list('pub_date', flat=True).afirst()
+        next_end = await self.filter(end_date__gte=now).order_by('end_date') \
+            .values_list('end_date', flat=True).afirst()
+        return min(filter(None, (next_pub, next_end)), default=None)
+
+
 class Question(models.Model):
     '''
     Questions model include question_text and published date
@@ -17,6 +55,17 @@ class Question(models.Model):
     pub_date = models.DateTimeField('date published', default=now)
     end_date = models.DateTimeField("date expired", null=True)
 
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # index page: published questions, oldest first
+            models.Index(fields=['pub_date'], name='polls_question_pub_date'),
+            # next poll to close, for the index's polls version
+            models.Index(fields=['end_date'], name='polls_question_end_date',
+                         condition=Q(end_date__isnull=False)),
+        ]
+
     @admin.display(
         boolean=True,
         ordering="pub_date",
@@ -45,6 +94,15 @@ class Question(models.Model):
         return self.is_published() and \
             (self.end_date is None or now <= self.end_date)
 
+    # (pub_date, end_date) as last written to the database
+    _saved_dates = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_dates = (instance.pub_date, instance.end_date)
+        return instance
+
     def __str__(self):
         return self.question_text
 
@@ -53,37 +111,218 @@ class Choice(models.Model):
     '''
     Choices for the polls questions
     '''
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # indexed by polls_choice_question_id below
+    question = models.ForeignKey(Question, on_delete=models.CASCADE,
+                                 db_index=False)
     choice_text = models.CharField(max_length=200)
+    # Tally of Vote rows for this choice, kept in step by Vote.save
+    # and release_vote_tally. Rebuild with `manage.py rebuild_vote_counts`.
+    vote_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # detail and results pages: a question's choices in order
+            models.Index(fields=['question', 'id'],
+                         name='polls_choice_question_id'),
+        ]
 
     @property
     def votes(self):
         '''Return the number of votes for this choice'''
-        return Vote.objects.filter(choice=self).count()
+        return self.vote_count
 
     @property
     def percent(self):
         '''
         Turn votes in this choice to percentage
         '''
-        all_votes = sum(choice.votes for choice in
-                        self.question.choice_set.all())
-        if all_votes == 0:
-            return '0.00%'
-        return f"{self.votes/all_votes*100:.2f}%"
+        all_votes = self.question.choice_set.aggregate(
+            total=Sum('vote_count'))['total']
+        return format_percent(self.votes, all_votes)
 
     def __str__(self):
         return self.choice_text
 
 
+# One statement that upserts a user's vote on a question and moves the
+# tallies with it. `previous` locks the existing vote, if any, so that a
+# concurrent vote by the same user waits instead of racing; an insert that
+# loses the race to a concurrent first vote does nothing and is retried.
+UPSERT_VOTE_SQL = '''
+WITH previous AS (
+    SELECT id, choice_id FROM {vote}
+    WHERE user_id = %(user)s AND question_id = %(question)s
+    FOR UPDATE
+), inserted AS (
+    INSERT INTO {vote} (user_id, question_id, choice_id)
+    SELECT %(user)s, %(question)s, %(choice)s
+    WHERE NOT EXISTS (SELECT 1 FROM previous)
+    ON CONFLICT (user_id, question_id) DO NOTHING
+    RETURNING id
+), moved AS (
+    UPDATE {vote} SET choice_id = %(choice)s FROM previous
+    WHERE {vote}.id = previous.id AND previous.choice_id <> %(choice)s
+    RETURNING {vote}.id
+), tally AS (
+    UPDATE {choice}
+    SET vote_count = vote_count + CASE WHEN id = %(choice)s THEN 1 ELSE -1 END
+    WHERE (id = %(choice)s AND EXISTS (SELECT 1 FROM inserted
+                                       UNION ALL SELECT 1 FROM moved))
+       OR (id = (SELECT choice_id FROM previous)
+           AND EXISTS (SELECT 1 FROM moved))
+)
+SELECT COALESCE((SELECT id FROM inserted), (SELECT id FROM previous))
+'''
+
+
+class VoteManager(models.Manager):
+
+    def cast(self, user, choice):
+        '''
+        Record user's vote for choice, replacing their earlier vote on the
+        same question. Return the vote, or None if the question is closed.
+        '''
+        if not poll_state.can_vote(choice.question_id):
+            return None
+        if connections[self.db].vendor == 'postgresql':
+            return self._upsert(user, choice)
+        with transaction.atomic(using=self.db):
+            vote, created = self.select_for_update().get_or_create(
+                user=user, question_id=choice.question_id,
+                defaults={'choice': choice})
+            if not created and vote.choice_id != choice.id:
+                vote.choice = choice
+                vote.save()
+        return vote
+
+    def _upsert(self, user, choice):
+        '''Single round trip version of cast() for PostgreSQL'''
+        sql = UPSERT_VOTE_SQL.format(vote=self.model._meta.db_table,
+                                     choice=Choice._meta.db_table)
+        params = {'user': user.pk, 'question': choice.question_id,
+                  'choice': choice.pk}
+        with connections[self.db].cursor() as cursor:
+            vote_id = None
+            while vote_id is None:
+                cursor.execute(sql, params)
+                vote_id, = cursor.fetchone()
+        results_cache.invalidate(choice.question_id)
+        vote = self.model(pk=vote_id, user=user, choice=choice,
+                          question_id=choice.question_id)
+        vote._state.adding = False
+        vote._state.db = self.db
+        vote._saved_choice_id = choice.pk
+        return vote
+
+
 class Vote(models.Model):
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # indexed by polls_vote_one_per_question
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    # Copied from choice so the database can enforce one vote per user
+    # per question.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+
+    objects = VoteManager()
+
+    class Meta:
+        constraints = [
+            # also the index for the vote path's (user, question) lookup
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='polls_vote_one_per_question'),
+        ]
+
+    # choice_id as last written to the database, None for unsaved votes
+    _saved_choice_id = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_choice_id = instance.choice_id
+        return instance
 
     def save(self, *args, **kwargs):
-        question = self.choice.question
-        if question.can_vote():
+        '''
+        Save the vote, moving the tally from the previously saved choice
+        to the current one in the same transaction. New votes and votes
+        that move to another choice are only saved while the question is
+        open.
+        '''
+        if self._saved_choice_id == self.choice_id:
             return super().save(*args, **kwargs)
+        if not poll_state.can_vote(self.choice.question_id):
+            return
+        self.question_id = self.choice.question_id
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self._saved_choice_id is not None:
+                Choice.objects.filter(pk=self._saved_choice_id) \
+                    .update(vote_count=F('vote_count') - 1)
+            Choice.objects.filter(pk=self.choice_id) \
+                .update(vote_count=F('vote_count') + 1)
+            # keep the cached choice in step with the database
+            self.choice.vote_count += 1
+            self._saved_choice_id = self.choice_id
+            results_cache.invalidate(self.question_id)
 
     def __str__(self):
         return f"{self.user.username} : {self.choice.choice_text}"
+
+
+class PollsVersion(models.Model):
+    '''
+    The single row through which server processes learn about changes made
+    by the others (see polls/cache.py): `version` changes with any question
+    or choice, `generation` when questions are added or removed or their
+    pub_date or end_date change.
+    '''
+    ROW = 1
+
+    version = models.CharField(max_length=32, default=new_token)
+    generation = models.CharField(max_length=32, default=new_token)
+
+
+class DatasetMember(models.Model):
+    '''
+    A question or user made by polls.datasets.generate(), so that
+    delete_dataset() removes exactly those and never a real one.
+    '''
+    question = models.OneToOneField(Question, on_delete=models.CASCADE,
+                                    null=True, related_name='+')
+    user = models.OneToOneField(User, on_delete=models.CASCADE, null=True,
+                                related_name='+')
+
+
+@receiver(post_delete, sender=Vote)
+def release_vote_tally(sender, instance, **kwargs):
+    '''Take a deleted vote off its choice's tally.'''
+    choice_id = instance._saved_choice_id or instance.choice_id
+    Choice.objects.filter(pk=choice_id) \
+        .update(vote_count=F('vote_count') - 1)
+    results_cache.invalidate(instance.question_id)
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_choice_results(sender, instance, **kwargs):
+    '''Drop cached results and the index when a question's choices change.'''
+    results_cache.invalidate(instance.question_id)
+    bump_polls_version()
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_state(sender, instance, signal, created=False,
+                              **kwargs):
+    '''
+    Drop the cached index when a question changes, and the poll states
+    when it is added or removed or its dates change.
+    '''
+    dates = (instance.pub_date, instance.end_date)
+    moved = created or signal is post_delete or \
+        dates != instance._saved_dates
+    instance._saved_dates = dates
+    if moved:
+        poll_state.invalidate()
+        transaction.on_commit(poll_state.invalidate)
+    bump_polls_version(generation=moved)
@@ -0,0 +1,66 @@
+'''
+Results engine for the results page: every choice's tally, the question
+total, and the percentages, computed with a single query.
+'''
+from collections import namedtuple
+from django.db.models import Sum, Window
+from .routers import primary
+
+
+ChoiceResult = namedtuple('ChoiceResult',
+                          ['id', 'choice_text', 'votes', 'percent'])
+
+
+def format_percent(votes, total):
+    '''Format votes as a percentage of total, e.g. "33.33%"'''
+    if not total:
+        return '0.00%'
+    return f"{votes/total*100:.2f}%"
+
+
+def _choices(question):
+    # results are cached for every visitor, so read them from the primary
+    return question.choice_set.using(primary(question.choice_set.model)) \
+        .order_by('pk') \
+        .annotate(total=Window(Sum('vote_count'))) \
+        .values_list('id', 'choice_text', 'vote_count', 'total')
+
+
+def _results(choices):
+    rows = []
+    total_votes = 0
+    for choice_id, text, votes, total in choices:
+        total_votes = total or 0
+        rows.append(ChoiceResult(choice_id, text, votes,
+                                 format_percent(votes, total)))
+    return rows, total_votes
+
+
+def question_results(question):
+    '''
+    Return (rows, total_votes) for question, where rows is a list of
+    ChoiceResult in choice order.
+    '''
+    return _results(_choices(question))
+
+
+async def aquestion_results(question):
+    '''Async version of question_results()'''
+    return _results([choice async for choice in _choices(question)])
+
+
+def with_pending_vote(rows, previous_choice_id, choice_id):
+    '''
+    Return (rows, total_votes) with a vote that has not been written yet
+    moved from previous_choice_id (None for a first vote) to choice_id.
+    '''
+    if previous_choice_id == choice_id:
+        return rows, sum(row.votes for row in rows)
+    votes = {row.id: row.votes for row in rows}
+    votes[choice_id] = votes.get(choice_id, 0) + 1
+    if previous_choice_id is not None:
+        votes[previous_choice_id] = votes.get(previous_choice_id, 0) - 1
+    total_votes = sum(votes[row.id] for row in rows)
+    return [row._replace(votes=votes[row.id],
+                         percent=format_percent(votes[row.id], total_votes))
+            for row in rows], total_votes
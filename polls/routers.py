@@ -0,0 +1,90 @@
+'''
+Read-replica routing.
+
+Views wrapped in use_replicas() read the polls models from one of the
+DATABASE_REPLICAS for the whole request, including rendering their
+template. Everything else, all writes, and the reads that fill caches
+shared between requests (see primary()) use the primary. After a vote,
+stick_to_primary() sets a cookie that keeps the voter on the primary for
+DATABASE_REPLICA_STICKY_SECONDS, so they see their own vote while the
+replicas catch up.
+'''
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+from django.template.response import SimpleTemplateResponse
+
+
+PRIMARY_COOKIE = 'polls_read_primary'
+
+_replica = ContextVar('polls_replica', default=None)
+
+
+class ReplicaRouter:
+    '''Send the polls reads of replica-enabled requests to a replica'''
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'polls':
+            return _replica.get() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return {obj1._state.db, obj2._state.db} <= databases or None
+
+
+def primary(model):
+    '''
+    The alias to read model from when the result is cached for other
+    requests, where a lagging replica's rows would outlive its lag.
+    '''
+    return router.db_for_write(model)
+
+
+@contextmanager
+def replica_reads(request):
+    '''Read the polls models from a replica in the block'''
+    if settings.DATABASE_REPLICAS and PRIMARY_COOKIE not in request.COOKIES:
+        alias = random.choice(settings.DATABASE_REPLICAS)
+    else:
+        alias = None
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def use_replicas(view):
+    '''Route the reads of view, and of rendering its response, to a replica'''
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with replica_reads(request):
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with replica_reads(request):
+                response = view(request, *args, **kwargs)
+                if isinstance(response, SimpleTemplateResponse):
+                    response.render()
+                return response
+    return wrapper
+
+
+def stick_to_primary(response):
+    '''Keep the client reading from the primary for a while after a write'''
+    if settings.DATABASE_REPLICAS:
+        response.set_cookie(PRIMARY_COOKIE, '1',
+                            max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+                            httponly=True, samesite='Lax')
+    return response
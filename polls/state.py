@@ -0,0 +1,136 @@
+'''
+Per-process index of which questions are published and open for voting.
+
+Instead of calling timezone.now() for every question on every render, the
+index keeps the ids of published and open questions in sets, with a heap
+of the upcoming pub_date/end_date transitions. A lookup only applies the
+transitions that have passed since the previous lookup. The sets are
+rebuilt from the database when the polls generation changes: at once for
+a question added, removed or given new dates in this process (see the
+receivers in models.py), and within POLLS_VERSION_CHECK_INTERVAL seconds
+for one changed by another process.
+'''
+import heapq
+import threading
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from .cache import polls_generation, shared_versions
+from .routers import primary
+
+# transition kinds; publishing sorts first when both happen at once
+PUBLISH = 0
+CLOSE = 1
+
+
+class PollState:
+    '''Published and open question ids, refreshed lazily'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._published = frozenset()
+        self._open = frozenset()
+        self._transitions = []
+        self._end_dates = {}
+        self._generation = None
+        self._stale = True
+
+    def invalidate(self):
+        '''Rebuild the index on the next lookup'''
+        self._stale = True
+
+    def is_published(self, question_id):
+        '''Whether question_id is past its publication time'''
+        return question_id in self._current()[0]
+
+    def can_vote(self, question_id):
+        '''Whether question_id is between its pub_date and end_date'''
+        return question_id in self._current()[1]
+
+    def published_ids(self):
+        return self._current()[0]
+
+    def open_ids(self):
+        return self._current()[1]
+
+    async def ais_published(self, question_id):
+        '''Async version of is_published()'''
+        return question_id in (await self._acurrent())[0]
+
+    async def acan_vote(self, question_id):
+        '''Async version of can_vote()'''
+        return question_id in (await self._acurrent())[1]
+
+    async def aopen_ids(self):
+        return (await self._acurrent())[1]
+
+    def _current(self):
+        with self._lock:
+            if self._stale or polls_generation() != self._generation:
+                self._load()
+            if self._transitions:
+                self._advance(timezone.now())
+            return self._published, self._open
+
+    async def _acurrent(self):
+        # only a rebuild, or the periodic generation check, needs a thread
+        if self._stale or shared_versions.check_due() or \
+                shared_versions.last_tokens()[1] != self._generation:
+            return await sync_to_async(self._current)()
+        with self._lock:
+            if self._transitions:
+                self._advance(timezone.now())
+            return self._published, self._open
+
+    def _load(self):
+        from .models import Question
+
+        generation = polls_generation()
+        now = timezone.now()
+        published, open_ids = set(), set()
+        transitions, end_dates = [], {}
+        questions = Question.objects.using(primary(Question)) \
+            .values_list('id', 'pub_date', 'end_date')
+        for question_id, pub_date, end_date in questions.iterator():
+            if pub_date <= now:
+                published.add(question_id)
+                if end_date is None or now <= end_date:
+                    open_ids.add(question_id)
+            else:
+                transitions.append((pub_date, PUBLISH, question_id))
+                end_dates[question_id] = end_date
+            if end_date is not None and now <= end_date:
+                transitions.append((end_date, CLOSE, question_id))
+                end_dates[question_id] = end_date
+        heapq.heapify(transitions)
+        self._published = frozenset(published)
+        self._open = frozenset(open_ids)
+        self._transitions = transitions
+        self._end_dates = end_dates
+        self._generation = generation
+        self._stale = False
+
+    def _advance(self, now):
+        '''Apply the transitions that have happened by now'''
+        published, open_ids = None, None
+        while self._transitions:
+            when, kind, question_id = self._transitions[0]
+            # a question can still be voted on at its exact end_date
+            if when > now or (when == now and kind == CLOSE):
+                break
+            heapq.heappop(self._transitions)
+            if published is None:
+                published, open_ids = set(self._published), set(self._open)
+            if kind == PUBLISH:
+                published.add(question_id)
+                end_date = self._end_dates.get(question_id)
+                if end_date is None or now <= end_date:
+                    open_ids.add(question_id)
+            else:
+                open_ids.discard(question_id)
+                self._end_dates.pop(question_id, None)
+        if published is not None:
+            self._published = frozenset(published)
+            self._open = frozenset(open_ids)
+
+
+poll_state = PollState()
@@ -0,0 +1,11 @@
+'''URLconf serving the async poll views, used by test_async_views'''
+from django.urls import include, path
+from django.views.generic.base import RedirectView
+from polls.urls import async_urlpatterns
+
+urlpatterns = [
+    path('', RedirectView.as_view(pattern_name='polls:index', permanent=False),
+         name='index'),
+    path('polls/', include((async_urlpatterns, 'polls'))),
+    path('accounts/', include('django.contrib.auth.urls')),
+]
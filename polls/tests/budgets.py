@@ -0,0 +1,91 @@
+'''
+Query-count and wall-time budgets for the polls views.
+
+budgets.json gives each view the most queries and milliseconds one
+request may take with the caches empty, against a dataset of the given
+scale. BudgetTestCase generates that dataset and empties the caches
+before each test, and within_budget() fails the test, listing the queries
+run, when the block it wraps goes over the view's budget:
+
+    with within_budget('polls:detail'):
+        self.client.get(url)
+
+A query budget may map database vendors to counts, for views that take a
+different path on PostgreSQL. Savepoints are not counted. Set
+BUDGET_TIME_FACTOR in the environment to scale the time budgets on a slow
+machine.
+'''
+import json
+import os
+import time
+from contextlib import ContextDecorator
+from pathlib import Path
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from polls.datasets import generate
+from polls.models import Question
+from polls.state import poll_state
+
+BUDGETS_FILE = Path(__file__).with_name('budgets.json')
+
+with open(BUDGETS_FILE) as budgets_file:
+    BUDGETS = json.load(budgets_file)
+
+TIME_FACTOR = float(os.environ.get('BUDGET_TIME_FACTOR', 1))
+
+
+class within_budget(ContextDecorator):
+    '''Fail if the block goes over the query or time budget of view'''
+
+    def __init__(self, view):
+        self.view = view
+        self.budget = BUDGETS['views'][view]
+
+    def __enter__(self):
+        self.queries = CaptureQueriesContext(connection)
+        self.queries.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        self.queries.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        queries = [query['sql'] for query in self.queries
+                   if 'SAVEPOINT' not in query['sql']]
+        allowed = self.budget['queries']
+        if isinstance(allowed, dict):
+            allowed = allowed[connection.vendor]
+        if len(queries) > allowed:
+            raise AssertionError(
+                f"{self.view} ran {len(queries)} queries, over its budget "
+                f"of {allowed}:\n"
+                + '\n'.join(f'{n}. {sql}'
+                            for n, sql in enumerate(queries, 1)))
+        limit = self.budget['ms'] * TIME_FACTOR
+        if elapsed > limit:
+            raise AssertionError(f'{self.view} took {elapsed:.1f}ms, over '
+                                 f'its budget of {limit:.0f}ms')
+        return False
+
+
+class BudgetTestCase(TestCase):
+    '''
+    Test case with a dataset of the budgets' scale and the caches emptied
+    before each test, so requests take the uncached path. `question` is
+    the hottest open question of the dataset.
+    '''
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids, cls.question_ids = generate(**BUDGETS['scale'],
+                                                  seed=0)
+        cls.question = Question.objects.get(pk=cls.question_ids[0])
+
+    def setUp(self):
+        caches['pages'].clear()
+        caches['results'].clear()
+        poll_state.invalidate()
+        return super().setUp()
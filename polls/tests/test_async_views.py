@@ -0,0 +1,147 @@
+import datetime
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from polls.models import Question, Vote
+from polls.state import poll_state
+
+
+def create_question(question_text, days=0, end_day=None):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with two choices.
+    """
+    options = {'question_text': question_text,
+               'pub_date': timezone.now() + datetime.timedelta(days=days)}
+    if end_day:
+        options['end_date'] = timezone.now() + \
+            datetime.timedelta(days=end_day)
+    q = Question.objects.create(**options)
+    q.choice_set.create(choice_text='choice1')
+    q.choice_set.create(choice_text='choice2')
+    return q
+
+
+acreate_question = sync_to_async(create_question)
+
+
+@override_settings(ROOT_URLCONF='polls.tests.async_urls')
+class AsyncViewTests(TestCase):
+    '''
+    Test the async views through the ASGI test client, under the same
+    URL names as the sync views.
+    '''
+    def setUp(self):
+        caches['pages'].clear()
+        caches['results'].clear()
+        poll_state.invalidate()
+        self.user = User.objects.create_user('voter', password='test')
+        return super().setUp()
+
+    async def test_index_lists_published_polls(self):
+        '''The index shows published polls and is cached afterwards'''
+        await Question.objects.acreate(question_text='No choices.')
+        question = await acreate_question('Open question.',
+                                          days=-1, end_day=1)
+        await acreate_question('Future question.', days=5)
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, question.question_text)
+        self.assertContains(response, 'OPEN')
+        self.assertNotContains(response, 'Future question.')
+        self.assertNotContains(response, 'No choices.')
+        # an update() skips the signals, so only the cached list can show
+        # the old text
+        await Question.objects.filter(pk=question.pk) \
+            .aupdate(question_text='Renamed question.')
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, 'Open question.')
+
+    async def test_index_without_polls(self):
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, 'No polls are available.')
+
+    async def test_detail(self):
+        '''An open poll shows its choices'''
+        question = await acreate_question('Open question.',
+                                          days=-1, end_day=1)
+        response = await self.async_client.get(
+            reverse('polls:detail', args=(question.id,)))
+        self.assertContains(response, 'choice1')
+        self.assertContains(response, 'choice2')
+
+    async def test_detail_of_closed_and_future_polls(self):
+        '''Polls outside their voting period redirect to the index'''
+        ended = await acreate_question('Ended question.',
+                                       days=-5, end_day=-1)
+        future = await acreate_question('Future question.', days=5)
+        for question in (ended, future):
+            response = await self.async_client.get(
+                reverse('polls:detail', args=(question.id,)))
+            self.assertRedirects(response, reverse('polls:index'),
+                                 fetch_redirect_response=False)
+
+    async def test_results(self):
+        question = await acreate_question('Results question.',
+                                          days=-1, end_day=1)
+        choice = await question.choice_set.afirst()
+        await Vote.objects.acreate(user=self.user, choice=choice,
+                                   question=question)
+        response = await self.async_client.get(
+            reverse('polls:results', args=(question.id,)))
+        self.assertEqual(1, response.context['total_votes'])
+        self.assertContains(response, '100.00%')
+
+    async def test_detail_and_results_of_logged_in_user(self):
+        '''The navbar of a logged in user renders without a sync query'''
+        question = await acreate_question('Open question.',
+                                          days=-1, end_day=1)
+        await self.async_client.aforce_login(self.user)
+        for name in ('polls:detail', 'polls:results'):
+            response = await self.async_client.get(
+                reverse(name, args=(question.id,)))
+            self.assertContains(response, 'Log Out')
+            self.assertEqual(self.user, response.context['user'])
+
+    async def test_results_of_missing_question(self):
+        response = await self.async_client.get(
+            reverse('polls:results', args=(1000,)))
+        self.assertEqual(404, response.status_code)
+
+    async def test_vote_requires_login(self):
+        question = await acreate_question('Open question.',
+                                          days=-1, end_day=1)
+        response = await self.async_client.post(
+            reverse('polls:vote', args=(question.id,)))
+        self.assertEqual(302, response.status_code)
+        self.assertIn(reverse('login'), response.url)
+
+    async def test_vote(self):
+        '''A vote is recorded and shown on the results page'''
+        question = await acreate_question('Open question.',
+                                          days=-1, end_day=1)
+        choice = await question.choice_set.afirst()
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse('polls:vote', args=(question.id,)),
+            {'choice': choice.id})
+        self.assertRedirects(response,
+                             reverse('polls:results', args=(question.id,)),
+                             fetch_redirect_response=False)
+        self.assertTrue(await Vote.objects.filter(
+            user=self.user, choice=choice).aexists())
+        await choice.arefresh_from_db()
+        self.assertEqual(1, choice.vote_count)
+
+    async def test_vote_without_choice(self):
+        question = await acreate_question('Open question.',
+                                          days=-1, end_day=1)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse('polls:vote', args=(question.id,)))
+        self.assertRedirects(response,
+                             reverse('polls:detail', args=(question.id,)),
+                             fetch_redirect_response=False)
+        self.assertEqual(0, await Vote.objects.acount())
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+from polls.datasets import DATASET_PREFIX, delete_dataset, generate
+from polls.models import Choice, DatasetMember, Question, Vote
+
+
+class GenerateTests(TestCase):
+    '''Test the synthetic load dataset'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids, cls.question_ids = generate(
+            users=200, questions=40, choices=3, votes=600, hot_fraction=0.1,
+            hot_share=0.8, seed=1)
+
+    def test_sizes(self):
+        self.assertEqual(200, User.objects.filter(pk__in=self.user_ids)
+                         .count())
+        self.assertEqual(40, len(self.question_ids))
+        self.assertEqual(120, Choice.objects.filter(
+            question__in=self.question_ids).count())
+        self.assertEqual(600, Vote.objects.count())
+
+    def test_hot_questions_get_most_votes(self):
+        published = Question.objects.filter(pk__in=self.question_ids) \
+            .filter(pub_date__lte=timezone.now()).order_by('pk')
+        hot = published[:4].values_list('pk', flat=True)
+        hot_votes = Vote.objects.filter(question__in=list(hot)).count()
+        self.assertGreater(hot_votes, 0.6 * 600)
+
+    def test_only_published_questions_get_votes(self):
+        self.assertFalse(Vote.objects.filter(
+            question__pub_date__gt=timezone.now()).exists())
+
+    def test_tallies_match_votes(self):
+        self.assertEqual(600, Choice.objects.aggregate(
+            total=Sum('vote_count'))['total'])
+
+    def test_repeatable(self):
+        votes = list(Vote.objects.order_by('pk')
+                     .values_list('choice__choice_text', flat=True))
+        delete_dataset()
+        generate(users=200, questions=40, choices=3, votes=600,
+                 hot_fraction=0.1, hot_share=0.8, seed=1)
+        self.assertEqual(votes, list(
+            Vote.objects.order_by('pk')
+            .values_list('choice__choice_text', flat=True)))
+
+    def test_delete(self):
+        self.assertEqual(40, delete_dataset())
+        self.assertFalse(Question.objects.exists())
+        self.assertFalse(Choice.objects.exists())
+        self.assertFalse(Vote.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(DatasetMember.objects.exists())
+
+    def test_delete_keeps_real_rows_named_like_the_dataset(self):
+        question = Question.objects.create(
+            question_text=f'{DATASET_PREFIX}question 0')
+        user = User.objects.create_user(f'{DATASET_PREFIX}real-user')
+        delete_dataset()
+        self.assertEqual([question], list(Question.objects.all()))
+        self.assertEqual([user], list(User.objects.all()))
+
+
+class BenchSuiteTests(TestCase):
+    '''Test the machine-readable output of bench_suite'''
+    def setUp(self):
+        handle, self.output = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.output)
+
+    def bench(self, *args):
+        call_command('bench_suite', '--users', 10, '--questions', 10,
+                     '--votes', 50, '--requests', 4, '--warmup', 1,
+                     '--voters', 2, '--output', self.output, *args,
+                     stdout=StringIO())
+        with open(self.output) as output:
+            return json.load(output)
+
+    def test_report(self):
+        report = self.bench()
+        self.assertEqual(['index', 'detail', 'results', 'vote'],
+                         list(report['endpoints']))
+        for result in report['endpoints'].values():
+            self.assertEqual(4, result['count'])
+            self.assertEqual(0, result['errors'])
+        self.assertEqual(10, report['dataset']['questions'])
+        # the dataset is rolled back
+        self.assertFalse(Question.objects.exists())
+
+    def test_regression(self):
+        '''A run with more queries than its baseline fails'''
+        report = self.bench()
+        report['endpoints']['vote']['queries_max'] = 0
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump(report, baseline)
+            baseline.flush()
+            with self.assertRaisesMessage(CommandError, 'vote: '):
+                self.bench('--baseline', baseline.name)
@@ -3,7 +3,8 @@ from django.test import TestCase
 from django.utils import timezone
 from django.urls import reverse
 from polls.models import Question
-
+from polls.state import poll_state
+from polls.tests.budgets import BudgetTestCase, within_budget
 
 
 def create_question(question_text, days=0, end_day=None,
@@ -51,4 +52,32 @@ class QuestionDetailViewTests(TestCase):
                                         days=-5)
         url = reverse('polls:detail', args=(past_question.id,))
         response = self.client.get(url)
-        self.assertContains(response, past_question.question_text)
\ No newline at end of file
+        self.assertContains(response, past_question.question_text)
+
+    def test_query_count(self):
+        """
+        The detail page fetches the question and its choices once each,
+        however many choices there are, and a closed poll costs nothing.
+        """
+        question = create_question(question_text='Past Question.', days=-5)
+        for n in range(3, 11):
+            question.choice_set.create(choice_text=f'choice{n}')
+        ended = create_question(question_text='Ended.', days=-5, end_day=-1)
+        url = reverse('polls:detail', args=(question.id,))
+        poll_state.can_vote(question.id)  # load the poll states up front
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'choice10')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:detail',
+                                               args=(ended.id,)))
+        self.assertEqual(response.status_code, 302)
+
+
+class DetailBudgetTests(BudgetTestCase):
+    '''Test the detail page against its budget in budgets.json'''
+    def test_within_budget(self):
+        url = reverse('polls:detail', args=(self.question.id,))
+        with within_budget('polls:detail'):
+            response = self.client.get(url)
+        self.assertContains(response, self.question.question_text)
@@ -0,0 +1,109 @@
+import csv
+import datetime
+import json
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from polls.export import aexport, export
+from polls.models import Question, Vote
+
+
+def create_question(question_text, days=0, end_day=None):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with two choices.
+    """
+    options = {'question_text': question_text,
+               'pub_date': timezone.now() + datetime.timedelta(days=days)}
+    if end_day:
+        options['end_date'] = timezone.now() + \
+            datetime.timedelta(days=end_day)
+    q = Question.objects.create(**options)
+    q.choice_set.create(choice_text='choice1')
+    q.choice_set.create(choice_text='choice2')
+    return q
+
+
+class ExportTests(TestCase):
+    '''Test the CSV and NDJSON exports of results and votes'''
+    @classmethod
+    def setUpTestData(cls):
+        cls.question = create_question('Exported question.',
+                                       days=-1, end_day=1)
+        cls.other = create_question('Other question.', days=-1, end_day=1)
+        cls.choice1, cls.choice2 = cls.question.choice_set.all()
+        cls.users = [User.objects.create_user(f'voter{n}', password='test')
+                     for n in range(3)]
+        for n, user in enumerate(cls.users):
+            Vote.objects.cast(user, cls.choice1 if n < 2 else cls.choice2)
+        Vote.objects.cast(cls.users[0], cls.other.choice_set.first())
+
+    def test_results_csv(self):
+        rows = list(csv.reader(
+            ''.join(export('results', 'csv', [self.question.id]))
+            .splitlines()))
+        self.assertEqual(['question_id', 'question_text', 'choice_id',
+                          'choice_text', 'votes', 'percent'], rows[0])
+        self.assertEqual(
+            [[str(self.question.id), 'Exported question.',
+              str(self.choice1.id), 'choice1', '2', '66.67%'],
+             [str(self.question.id), 'Exported question.',
+              str(self.choice2.id), 'choice2', '1', '33.33%']],
+            rows[1:])
+
+    def test_results_of_all_questions(self):
+        '''Percentages are computed per question'''
+        rows = [json.loads(line)
+                for line in ''.join(export('results', 'ndjson'))
+                .splitlines()]
+        self.assertEqual(4, len(rows))
+        self.assertEqual(['66.67%', '33.33%', '100.00%', '0.00%'],
+                         [row['percent'] for row in rows])
+
+    def test_votes_ndjson(self):
+        rows = [json.loads(line)
+                for line in ''.join(export('votes', 'ndjson',
+                                           [self.question.id]))
+                .splitlines()]
+        self.assertEqual(['voter0', 'voter1', 'voter2'],
+                         [row['username'] for row in rows])
+        self.assertEqual({self.question.id},
+                         {row['question_id'] for row in rows})
+        self.assertEqual('choice2', rows[2]['choice_text'])
+
+    def test_export_is_chunked(self):
+        '''Rows are sent a chunk at a time, not all at once'''
+        with mock.patch('polls.export.EXPORT_CHUNK_SIZE', 2):
+            chunks = list(export('votes', 'ndjson'))
+        self.assertEqual([2, 2], [chunk.count('\n') for chunk in chunks])
+
+    async def test_async_export(self):
+        chunks = [chunk async for chunk in aexport('votes', 'csv')]
+        self.assertEqual(5, ''.join(chunks).count('\n'))
+
+    def test_admin_action(self):
+        '''Staff can download the votes of the selected questions'''
+        User.objects.create_superuser('admin', password='test')
+        self.client.login(username='admin', password='test')
+        response = self.client.post(
+            reverse('admin:polls_question_changelist'),
+            {'action': 'export_votes_csv',
+             '_selected_action': [self.other.id]})
+        self.assertTrue(response.streaming)
+        self.assertEqual('text/csv', response['Content-Type'])
+        self.assertIn('polls-votes.csv', response['Content-Disposition'])
+        rows = list(csv.reader(
+            b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(2, len(rows))
+        self.assertEqual('voter0', rows[1][-1])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_polls', 'results', '--format', 'ndjson',
+                     '--question', str(self.other.id), stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([1, 0], [row['votes'] for row in rows])
@@ -0,0 +1,91 @@
+import json
+import math
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from polls.fixtures import iter_fixture, load_fixture
+from polls.models import Choice, Question, Vote
+
+
+FIXTURES = ['data/users.json', 'data/polls-v4.json', 'data/votes-v4.json']
+
+
+class IterFixtureTests(SimpleTestCase):
+    '''Test the incremental fixture parser'''
+    def test_matches_json_load(self):
+        '''Objects split across reads are decoded whole'''
+        with open('data/polls-v4.json') as stream:
+            expected = json.load(stream)
+        for read_size in (1, 7, 4096):
+            with open('data/polls-v4.json') as stream:
+                self.assertEqual(expected,
+                                 list(iter_fixture(stream, read_size)))
+
+    def test_empty_fixture(self):
+        self.assertEqual([], list(iter_fixture(StringIO(' [ ] '))))
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_fixture(StringIO('{"model": "polls.question"}')))
+
+    def test_truncated(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_fixture(StringIO('[{"model": "polls.'), read_size=4))
+
+
+class LoadFixturesTests(TestCase):
+    '''Test loading the bundled fixtures with load_fixtures'''
+    def load(self):
+        out = StringIO()
+        call_command('load_fixtures', *FIXTURES, stdout=out)
+        return out.getvalue()
+
+    def test_loads_like_loaddata(self):
+        self.load()
+        loaded = {model: set(model.objects.values_list('pk', flat=True))
+                  for model in (User, Question, Choice, Vote)}
+        Vote.objects.all().delete()
+        Question.objects.all().delete()
+        User.objects.all().delete()
+        call_command('loaddata', *FIXTURES, verbosity=0)
+        for model, pks in loaded.items():
+            self.assertEqual(
+                set(model.objects.values_list('pk', flat=True)), pks)
+
+    def test_idempotent(self):
+        '''Loading again inserts nothing'''
+        self.load()
+        out = self.load()
+        self.assertIn('data/votes-v4.json: 0 of', out)
+        with open('data/votes-v4.json') as stream:
+            self.assertEqual(len(json.load(stream)), Vote.objects.count())
+
+    def test_batches(self):
+        '''A fixture is inserted a batch at a time'''
+        with open('data/users.json') as stream, \
+                CaptureQueriesContext(connection) as queries:
+            counts = load_fixture(stream, batch_size=3)
+        read, inserted = counts[User]
+        self.assertEqual(read, inserted)
+        inserts = [query for query in queries
+                   if 'INTO "auth_user" ' in query['sql']]
+        self.assertEqual(math.ceil(read / 3), len(inserts))
+
+    def test_existing_objects_kept(self):
+        '''Unlike loaddata, objects already in the database are not changed'''
+        self.load()
+        Question.objects.filter(pk=2).update(question_text='Changed')
+        self.load()
+        self.assertEqual('Changed',
+                         Question.objects.get(pk=2).question_text)
+
+    def test_sequences_reset(self):
+        '''New objects get primary keys after the loaded ones'''
+        self.load()
+        question = Question.objects.create(question_text='New question')
+        self.assertGreater(question.pk,
+                           max(Question.objects.exclude(pk=question.pk)
+                               .values_list('pk', flat=True)))
@@ -1,8 +1,12 @@
 import datetime
+import time
+from django.core.cache import caches
 from django.utils import timezone
 from django.test import TestCase
 from django.urls import reverse
 from polls.models import Question
+from polls.state import poll_state
+from polls.tests.budgets import BudgetTestCase, within_budget
 
 
 def create_question(question_text, days=0, end_day=None,
@@ -31,6 +35,10 @@ class QuestionIndexViewTests(TestCase):
     Test if questions show up when there are no_choice, past its pub_date,
     its pub_date is in the future, or no questions at all.
     '''
+    def setUp(self):
+        caches['pages'].clear()
+        return super().setUp()
+
     def test_no_questions(self):
         """
         If no questions exist, an appropriate message is displayed.
@@ -99,11 +107,79 @@ class QuestionIndexViewTests(TestCase):
             [],
         )
 
+    def test_query_count_independent_of_questions(self):
+        """
+        Building the poll list costs the same queries however many
+        questions exist, and a cached list costs none.
+        """
+        for n in range(20):
+            create_question(question_text=f"Past question {n}.", days=-n-1)
+        poll_state.open_ids()  # load the poll states up front
+        # next publication and end times for the polls version, the list
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('polls:index'))
+        self.assertEqual(len(response.context_data['questions_list']), 5)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('polls:index'))
+
+
+class QuestionIndexCacheTests(TestCase):
+    '''
+    Test that the cached poll list changes with the questions, their
+    choices, and their publication and end times.
+    '''
+    def setUp(self):
+        caches['pages'].clear()
+        return super().setUp()
+
+    def test_new_question_shows_up(self):
+        """A question created after the list was cached is shown"""
+        self.client.get(reverse('polls:index'))
+        create_question(question_text="New question.", days=-1)
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "New question.")
+
+    def test_edited_choice_updates_list(self):
+        """Removing a choice from a listed question hides it"""
+        question = create_question(question_text="Two choices.", days=-1)
+        self.client.get(reverse('polls:index'))
+        question.choice_set.first().delete()
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, "Two choices.")
+
+    def test_question_opens_without_a_write(self):
+        """A question appears once its pub_date passes"""
+        pub_date = timezone.now() + datetime.timedelta(seconds=0.5)
+        question = Question.objects.create(question_text="Opening soon.",
+                                           pub_date=pub_date)
+        question.choice_set.create(choice_text='choice1')
+        question.choice_set.create(choice_text='choice2')
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, "Opening soon.")
+        time.sleep(0.6)
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Opening soon.")
+
+    def test_question_closes_without_a_write(self):
+        """A listed question shows as closed once its end_date passes"""
+        question = create_question(question_text="Closing soon.", days=-1)
+        question.end_date = timezone.now() + datetime.timedelta(seconds=0.5)
+        question.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "OPEN")
+        time.sleep(0.6)
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "CLOSED")
+
 
 class QuestionIsPublishedTest(TestCase):
     '''
     Test is_published() method with past, default, and future questions.
     '''
+    def setUp(self):
+        caches['pages'].clear()
+        return super().setUp()
+
     def test_past_question(self):
         '''
         Test is_published() in Question and check if it shows up in index view
@@ -129,4 +205,20 @@ class QuestionIsPublishedTest(TestCase):
         url = reverse('polls:index')
         self.assertFalse(future_question.is_published())
         response = self.client.get(url)
-        self.assertNotContains(response, future_question.question_text)
\ No newline at end of file
+        self.assertNotContains(response, future_question.question_text)
+
+
+class IndexBudgetTests(BudgetTestCase):
+    '''Test the index page against its budget in budgets.json'''
+    def test_within_budget(self):
+        with within_budget('polls:index'):
+            response = self.client.get(reverse('polls:index'))
+        self.assertEqual(len(response.context_data['questions_list']), 5)
+
+    def test_over_budget_fails(self):
+        """The harness fails a request that runs too many queries"""
+        budget = within_budget('polls:index')
+        budget.budget = dict(budget.budget, queries=1)
+        with self.assertRaisesMessage(AssertionError, 'over its budget'):
+            with budget:
+                self.client.get(reverse('polls:index'))
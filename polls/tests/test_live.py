@@ -0,0 +1,153 @@
+import datetime
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from polls.live import delta, publisher
+from polls.models import Question, Vote
+from polls.results import ChoiceResult
+from polls.state import poll_state
+
+
+def create_question(question_text, days=0, end_day=None):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with two choices.
+    """
+    options = {'question_text': question_text,
+               'pub_date': timezone.now() + datetime.timedelta(days=days)}
+    if end_day:
+        options['end_date'] = timezone.now() + \
+            datetime.timedelta(days=end_day)
+    q = Question.objects.create(**options)
+    q.choice_set.create(choice_text='choice1')
+    q.choice_set.create(choice_text='choice2')
+    return q
+
+
+def parse_event(chunk):
+    '''Return (event, data) for an SSE event, or None for anything else'''
+    fields = dict(line.split(': ', 1)
+                  for line in chunk.decode().splitlines() if ': ' in line)
+    if 'event' not in fields:
+        return None
+    return fields['event'], json.loads(fields['data'])
+
+
+async def next_event(stream):
+    '''Skip retry and keepalive lines up to the next event'''
+    async for chunk in stream:
+        event = parse_event(chunk)
+        if event is not None:
+            return event
+
+
+class DeltaTest(SimpleTestCase):
+    def test_delta_lists_changed_choices(self):
+        '''Only choices whose votes or percentage changed are sent'''
+        before = [ChoiceResult(1, 'a', 1, '50.00%'),
+                  ChoiceResult(2, 'b', 1, '50.00%'),
+                  ChoiceResult(3, 'c', 0, '0.00%')]
+        after = [ChoiceResult(1, 'a', 2, '66.67%'),
+                 ChoiceResult(2, 'b', 1, '33.33%'),
+                 ChoiceResult(3, 'c', 0, '0.00%')]
+        self.assertEqual(
+            {'total_votes': 3,
+             'choices': [{'id': 1, 'votes': 2, 'percent': '66.67%'},
+                         {'id': 2, 'votes': 1, 'percent': '33.33%'}]},
+            delta(before, after, 3))
+
+
+@override_settings(LIVE_RESULTS_INTERVAL=0.05, LIVE_RESULTS_HEARTBEAT=0.1,
+                   LIVE_RESULTS_IDLE_TIMEOUT=0.5)
+class ResultsStreamTests(TestCase):
+    '''
+    Test the live results stream through the ASGI test client, and its
+    single-snapshot fallback under WSGI.
+    '''
+    def setUp(self):
+        caches['results'].clear()
+        poll_state.invalidate()
+        self.user = User.objects.create_user('voter', password='test')
+        self.question = create_question('Live question.', days=-1, end_day=1)
+        self.url = reverse('polls:results_stream', args=(self.question.id,))
+        return super().setUp()
+
+    async def test_snapshot_then_delta(self):
+        '''A stream starts with the results and then sends vote deltas'''
+        response = await self.async_client.get(self.url)
+        self.assertEqual('text/event-stream', response['Content-Type'])
+        stream = aiter(response.streaming_content)
+        event, data = await next_event(stream)
+        self.assertEqual('results', event)
+        self.assertEqual(0, data['total_votes'])
+        self.assertEqual(['choice1', 'choice2'],
+                         [choice['choice_text'] for choice in data['choices']])
+        choice = await self.question.choice_set.afirst()
+        await sync_to_async(Vote.objects.cast)(self.user, choice)
+        event, data = await next_event(stream)
+        self.assertEqual('delta', event)
+        self.assertEqual(1, data['total_votes'])
+        self.assertIn({'id': choice.id, 'votes': 1, 'percent': '100.00%'},
+                      data['choices'])
+        # the stream closes once it has been idle for the timeout
+        self.assertIsNone(await next_event(stream))
+        self.assertEqual(0, publisher.streams)
+        self.assertEqual({}, publisher.channels)
+
+    async def test_streams_share_one_channel(self):
+        '''Every stream of a question is fed by the same channel'''
+        first = aiter((await self.async_client.get(self.url))
+                      .streaming_content)
+        second = aiter((await self.async_client.get(self.url))
+                       .streaming_content)
+        self.assertEqual('results', (await next_event(first))[0])
+        self.assertEqual('results', (await next_event(second))[0])
+        self.assertEqual(2, publisher.streams)
+        self.assertEqual([self.question.id], list(publisher.channels))
+        self.assertIsNone(await next_event(first))
+        self.assertIsNone(await next_event(second))
+        self.assertEqual(0, publisher.streams)
+
+    async def test_idle_stream_sends_keepalives(self):
+        response = await self.async_client.get(self.url)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertIn(b': keepalive\n\n', chunks)
+
+    @override_settings(LIVE_RESULTS_MAX_STREAMS=0)
+    async def test_stream_limit(self):
+        '''Streams over the limit are turned away'''
+        response = await self.async_client.get(self.url)
+        self.assertEqual(503, response.status_code)
+        self.assertIn('Retry-After', response)
+
+    async def test_unpublished_question(self):
+        future = await sync_to_async(create_question)('Future question.',
+                                                      days=5)
+        response = await self.async_client.get(
+            reverse('polls:results_stream', args=(future.id,)))
+        self.assertEqual(404, response.status_code)
+
+    def test_wsgi_sends_one_snapshot(self):
+        '''Under WSGI the browser polls for snapshots at the retry interval'''
+        response = self.client.get(self.url)
+        self.assertFalse(response.streaming)
+        self.assertIn(b'retry: 50\n\n', response.content)
+        event, data = parse_event(response.content.split(b'\n\n', 1)[1])
+        self.assertEqual('results', event)
+        self.assertEqual(2, len(data['choices']))
+
+    def test_wsgi_results_page_does_not_stream(self):
+        '''Without streams the page would poll through every middleware'''
+        response = self.client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertNotContains(response, 'EventSource')
+
+    async def test_asgi_results_page_streams(self):
+        response = await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'EventSource')
+        self.assertContains(response, self.url)
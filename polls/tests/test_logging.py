@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import redirect_stderr
+from io import StringIO
+from django.test import SimpleTestCase
+from kupolls.log import JsonFormatter, QueuedFileHandler
+
+
+class BlockedHandler(logging.Handler):
+    '''Handler that stands for a slow disk: it waits until released'''
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.released.wait()
+        self.records.append(record.getMessage())
+
+
+class QueuedLoggingTests(SimpleTestCase):
+    '''Test the queued JSON file logging set up in LOGGING'''
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, 'test.log')
+        self.logger = logging.getLogger('polls.tests.queued')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(setattr, self.logger, 'propagate', True)
+
+    def handler(self, **kwargs):
+        handler = QueuedFileHandler(self.filename, **kwargs)
+        handler.setFormatter(JsonFormatter())
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def block(self, handler):
+        '''Make the listener wait, as on a stalled disk'''
+        blocked = BlockedHandler()
+        handler.listener.handlers = (blocked,)
+        self.addCleanup(blocked.released.set)
+        return blocked
+
+    def lines(self, handler):
+        handler.listener.stop()
+        handler.target.flush()
+        with open(self.filename) as log:
+            return [json.loads(line) for line in log]
+
+    def test_json_lines(self):
+        handler = self.handler()
+        self.logger.info('%s voted for %s', 'demo1', 'Rice',
+                         extra={'question_id': 3})
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self.logger.exception('Failed')
+        first, second = self.lines(handler)
+        self.assertEqual('demo1 voted for Rice', first['message'])
+        self.assertEqual('INFO', first['level'])
+        self.assertEqual('polls.tests.queued', first['logger'])
+        self.assertEqual(3, first['question_id'])
+        self.assertIn('ZeroDivisionError', second['exc_info'])
+
+    def test_slow_disk_drops_instead_of_blocking(self):
+        handler = self.handler(queue_size=5)
+        blocked = self.block(handler)
+        start = time.perf_counter()
+        for n in range(100):
+            self.logger.info('record %d', n)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertGreater(handler.dropped, 0)
+        blocked.released.set()
+        while not handler.queue.empty():
+            time.sleep(0.01)
+        self.logger.info('after')
+        handler.listener.stop()
+        self.assertTrue(blocked.records[-2].startswith('Dropped '))
+        self.assertEqual('after', blocked.records[-1])
+
+    def test_block_policy_waits_for_room(self):
+        handler = self.handler(queue_size=1, policy='block', timeout=0.05)
+        self.block(handler)
+        for n in range(3):
+            self.logger.info('record %d', n)
+        start = time.perf_counter()
+        self.logger.info('waits')
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        self.assertGreater(handler.dropped, 0)
+
+    def test_rotation(self):
+        handler = self.handler(max_bytes=1000, backup_count=2)
+        for n in range(50):
+            self.logger.info('record %d', n)
+        self.lines(handler)
+        self.assertTrue(os.path.exists(self.filename + '.1'))
+        self.assertFalse(os.path.exists(self.filename + '.3'))
+
+    def test_standard_error(self):
+        stderr = StringIO()
+        with redirect_stderr(stderr):
+            handler = QueuedFileHandler('-')
+        handler.setFormatter(JsonFormatter())
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.logger.info('record')
+        handler.close()
+        self.assertEqual('record',
+                         json.loads(stderr.getvalue())['message'])
+        self.assertFalse(os.path.exists('-'))
@@ -0,0 +1,128 @@
+import datetime
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from polls.metrics import Histogram, request_metrics
+from polls.models import Question
+
+
+def create_question(question_text, days=0, end_day=None):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with two choices.
+    """
+    options = {'question_text': question_text,
+               'pub_date': timezone.now() + datetime.timedelta(days=days)}
+    if end_day:
+        options['end_date'] = timezone.now() + \
+            datetime.timedelta(days=end_day)
+    q = Question.objects.create(**options)
+    q.choice_set.create(choice_text='choice1')
+    q.choice_set.create(choice_text='choice2')
+    return q
+
+
+def metric(text, line_start):
+    '''The value of the sample in text whose line starts with line_start'''
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f'{line_start} not in metrics:\n{text}')
+
+
+class HistogramTest(TestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value)
+        self.assertEqual([('0.1', 1), ('1.0', 3), ('+Inf', 4)],
+                         list(histogram.samples()))
+        self.assertAlmostEqual(4.25, histogram.sum)
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_TOKEN='secret')
+class MetricsEndpointTests(TestCase):
+    '''Test the request metrics and the /metrics endpoint'''
+    def setUp(self):
+        request_metrics.reset()
+        self.question = create_question('Measured question.', days=-1,
+                                        end_day=1)
+        return super().setUp()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_request_counts_and_latency(self):
+        url = reverse('polls:results', args=(self.question.id,))
+        for _ in range(3):
+            self.client.get(url)
+        text = self.scrape()
+        self.assertEqual(3, metric(
+            text, 'polls_http_requests_total{view="polls:results",'
+            'method="GET",status="200"}'))
+        self.assertEqual(3, metric(
+            text, 'polls_http_request_duration_seconds_count'
+            '{view="polls:results"}'))
+        self.assertEqual(3, metric(
+            text, 'polls_http_request_duration_seconds_bucket'
+            '{view="polls:results",le="+Inf"}'))
+
+    def test_queries_and_templates(self):
+        '''Sampled requests record their queries and render time'''
+        self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        text = self.scrape()
+        self.assertEqual(1, metric(
+            text, 'polls_db_queries_per_request_count{view="polls:detail"}'))
+        self.assertGreater(metric(
+            text, 'polls_db_queries_per_request_sum{view="polls:detail"}'),
+            0)
+        self.assertGreater(metric(
+            text, 'polls_template_render_duration_seconds_sum'
+            '{view="polls:detail"}'), 0)
+        self.assertIn('polls_results_cache_hits_total', text)
+
+    @override_settings(ROOT_URLCONF='polls.tests.async_urls')
+    async def test_queries_of_async_views(self):
+        '''Queries run on sync_to_async threads count for their request'''
+        await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        text = request_metrics.exposition()
+        self.assertEqual(1, metric(
+            text, 'polls_db_queries_per_request_count{view="polls:results"}'))
+        self.assertGreater(metric(
+            text, 'polls_db_queries_per_request_sum{view="polls:results"}'),
+            0)
+        self.assertGreater(metric(
+            text, 'polls_db_query_duration_seconds_sum'
+            '{view="polls:results"}'), 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_counted(self):
+        self.client.get(reverse('polls:index'))
+        text = self.scrape()
+        self.assertEqual(1, metric(
+            text, 'polls_http_request_duration_seconds_count'
+            '{view="polls:index"}'))
+        self.assertNotIn(
+            'polls_db_queries_per_request_count{view="polls:index"}', text)
+
+    def test_unmatched_urls_share_a_label(self):
+        self.client.get('/no/such/page/')
+        self.assertIn('view="unmatched"', self.scrape())
+
+    def test_requires_token(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(403, response.status_code)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_staff_without_token(self):
+        self.assertEqual(403, self.client.get(reverse('metrics')).status_code)
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(200, self.client.get(reverse('metrics')).status_code)
@@ -1,9 +1,14 @@
 import datetime
+import multiprocessing
+import time
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
 from django.contrib.auth import authenticate
+from polls.cache import polls_generation, polls_version
 from polls.models import Question, Vote
+from polls.state import poll_state
 
 
 def create_question(question_text, days=0, end_day=None,
@@ -116,3 +121,97 @@ class QuestionCanVoteTest(TestCase):
         self.assertTrue(last_sec_question.can_vote())
         self.vote(choice)
         self.assertEqual(1, choice.votes)
+
+
+class PollStateTest(TestCase):
+    '''
+    Test that the poll state index agrees with is_published() and
+    can_vote() as questions are created, edited, opened and closed.
+    '''
+    def test_states(self):
+        '''Future, open, and ended questions are indexed correctly'''
+        future = create_question("future", days=5)
+        present = create_question("present", days=-5, end_day=5)
+        ended = create_question("ended", days=-5, end_day=-1)
+        for question in (future, present, ended):
+            self.assertEqual(question.is_published(),
+                             poll_state.is_published(question.id))
+            self.assertEqual(question.can_vote(),
+                             poll_state.can_vote(question.id))
+
+    def test_edit_refreshes_state(self):
+        '''Saving a question updates the index'''
+        question = create_question("present", days=-5, end_day=5)
+        self.assertTrue(poll_state.can_vote(question.id))
+        question.end_date = timezone.now() - datetime.timedelta(days=1)
+        question.save()
+        self.assertFalse(poll_state.can_vote(question.id))
+
+    def test_only_date_changes_rebuild(self):
+        '''Editing text or choices keeps the index and its generation'''
+        question = create_question("present", days=-5, end_day=5)
+        self.assertTrue(poll_state.can_vote(question.id))
+        generation = polls_generation()
+        question.question_text = "edited"
+        question.save()
+        question.choice_set.create(choice_text="choice3")
+        self.assertEqual(generation, polls_generation())
+        with self.assertNumQueries(0):
+            self.assertTrue(poll_state.can_vote(question.id))
+
+    def test_transitions_apply_without_a_write(self):
+        '''Questions open and close as their dates pass'''
+        now = timezone.now()
+        opening = Question.objects.create(
+            question_text="opening",
+            pub_date=now + datetime.timedelta(seconds=0.5))
+        closing = Question.objects.create(
+            question_text="closing", pub_date=now,
+            end_date=now + datetime.timedelta(seconds=0.5))
+        self.assertFalse(poll_state.is_published(opening.id))
+        self.assertTrue(poll_state.can_vote(closing.id))
+        time.sleep(0.6)
+        self.assertTrue(poll_state.can_vote(opening.id))
+        self.assertFalse(poll_state.can_vote(closing.id))
+        self.assertTrue(poll_state.is_published(closing.id))
+
+
+def edit_polls(question_id):
+    '''Close question_id and add a question, as another process would'''
+    question = Question.objects.get(pk=question_id)
+    question.end_date = timezone.now() - datetime.timedelta(days=1)
+    question.save()
+    create_question("added", days=-1)
+
+
+class SharedPollStateTest(TransactionTestCase):
+    '''
+    Test that a process sees the questions another process changed once
+    POLLS_VERSION_CHECK_INTERVAL has passed.
+    '''
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("an in-memory database is not shared")
+        return super().setUp()
+
+    def run_in_other_process(self, target, *args):
+        # the child must not share this process's database connections
+        connections.close_all()
+        process = multiprocessing.get_context('fork').Process(
+            target=target, args=args)
+        process.start()
+        process.join()
+        self.assertEqual(0, process.exitcode)
+
+    def test_changes_from_another_process(self):
+        question = create_question("present", days=-5, end_day=5)
+        self.assertTrue(poll_state.can_vote(question.id))
+        version = polls_version()
+        self.run_in_other_process(edit_polls, question.id)
+        added = Question.objects.get(question_text="added")
+        # not read again until the interval has passed
+        self.assertTrue(poll_state.can_vote(question.id))
+        with override_settings(POLLS_VERSION_CHECK_INTERVAL=0):
+            self.assertFalse(poll_state.can_vote(question.id))
+            self.assertTrue(poll_state.is_published(added.id))
+            self.assertNotEqual(version, polls_version())
@@ -0,0 +1,139 @@
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.utils import timezone
+from django.urls import reverse
+from polls.cache import results_cache
+from polls.models import Question, Vote
+from polls.tests.budgets import BudgetTestCase, within_budget
+
+
+def create_question(question_text, days=0, end_day=None, choices=2):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with `choices` choices.
+    """
+    options = {'question_text': question_text,
+               'pub_date': timezone.now() + datetime.timedelta(days=days)}
+    if end_day:
+        options['end_date'] = timezone.now() + \
+            datetime.timedelta(days=end_day)
+    q = Question.objects.create(**options)
+    for n in range(1, choices + 1):
+        q.choice_set.create(choice_text=f'choice{n}')
+    return q
+
+
+class ResultsViewTests(TestCase):
+    '''
+    Test the tallies shown on the results page and how many queries
+    it costs to compute them.
+    '''
+    def setUp(self):
+        caches['results'].clear()
+        return super().setUp()
+
+    def test_results_rows(self):
+        '''Each choice is shown with its votes and percentage'''
+        question = create_question('Results question.', days=-1, end_day=1)
+        choice1, choice2 = question.choice_set.all()
+        for n in range(3):
+            user = User.objects.create_user(f'user{n}', password='test')
+            Vote.objects.create(user=user,
+                                choice=choice1 if n < 2 else choice2)
+        response = self.client.get(reverse('polls:results',
+                                           args=(question.id,)))
+        rows = response.context['results']
+        self.assertEqual(3, response.context['total_votes'])
+        self.assertEqual([(choice1.id, 'choice1', 2, '66.67%'),
+                          (choice2.id, 'choice2', 1, '33.33%')], rows)
+        self.assertContains(response, '66.67%')
+
+    def test_results_without_votes(self):
+        '''A question with no votes shows 0.00% for every choice'''
+        question = create_question('Empty question.', days=-1)
+        response = self.client.get(reverse('polls:results',
+                                           args=(question.id,)))
+        self.assertEqual(0, response.context['total_votes'])
+        self.assertEqual(['0.00%', '0.00%'],
+                         [row.percent for row in response.context['results']])
+
+    def test_query_count_independent_of_choices(self):
+        '''
+        Computing the results costs the same number of queries whether
+        the question has 2 or 20 choices.
+        '''
+        small = create_question('Small question.', days=-1, choices=2)
+        large = create_question('Large question.', days=-1, choices=20)
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.get(reverse('polls:results', args=(small.id,)))
+        with self.assertNumQueries(len(small_queries)):
+            self.client.get(reverse('polls:results', args=(large.id,)))
+        self.assertEqual(2, len(small_queries))
+
+
+class ResultsCacheTests(TestCase):
+    '''
+    Test that results are served from the cache until a vote or a
+    change to the choices invalidates them.
+    '''
+    def setUp(self):
+        caches['results'].clear()
+        self.question = create_question('Cached question.',
+                                        days=-1, end_day=1)
+        self.url = reverse('polls:results', args=(self.question.id,))
+        return super().setUp()
+
+    def test_cache_hit_skips_results_query(self):
+        '''A second visit only fetches the question'''
+        self.client.get(self.url)
+        hits = results_cache.stats()['hits']
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        self.assertEqual(hits + 1, results_cache.stats()['hits'])
+
+    def test_vote_invalidates_results(self):
+        '''A new vote shows up on the next visit'''
+        self.client.get(self.url)
+        user = User.objects.create_user('voter', password='test')
+        Vote.objects.cast(user, self.question.choice_set.first())
+        response = self.client.get(self.url)
+        self.assertEqual(1, response.context['total_votes'])
+
+    def test_deleted_vote_invalidates_results(self):
+        '''A deleted vote disappears on the next visit'''
+        user = User.objects.create_user('voter', password='test')
+        Vote.objects.cast(user, self.question.choice_set.first())
+        self.client.get(self.url)
+        user.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(0, response.context['total_votes'])
+
+    def test_new_choice_invalidates_results(self):
+        '''A choice added to the question shows up on the next visit'''
+        self.client.get(self.url)
+        self.question.choice_set.create(choice_text='choice3')
+        response = self.client.get(self.url)
+        self.assertEqual(3, len(response.context['results']))
+
+    def test_cache_stats_requires_staff(self):
+        '''Only staff can read the cache counters'''
+        response = self.client.get(reverse('polls:cache_stats'))
+        self.assertEqual(302, response.status_code)
+        User.objects.create_user('staff', password='test', is_staff=True)
+        self.client.login(username='staff', password='test')
+        response = self.client.get(reverse('polls:cache_stats'))
+        self.assertEqual({'hits', 'misses', 'hit_ratio'},
+                         set(response.json()))
+
+
+class ResultsBudgetTests(BudgetTestCase):
+    '''Test the results page against its budget in budgets.json'''
+    def test_within_budget(self):
+        url = reverse('polls:results', args=(self.question.id,))
+        with within_budget('polls:results'):
+            response = self.client.get(url)
+        self.assertEqual(4, len(response.context['results']))
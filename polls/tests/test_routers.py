@@ -0,0 +1,113 @@
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connections
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from polls.models import Question, Vote
+from polls.routers import PRIMARY_COOKIE, ReplicaRouter, replica_reads
+from polls.state import poll_state
+
+
+def create_question(question_text, days=0, end_day=None):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with two choices.
+    """
+    options = {'question_text': question_text,
+               'pub_date': timezone.now() + datetime.timedelta(days=days)}
+    if end_day:
+        options['end_date'] = timezone.now() + \
+            datetime.timedelta(days=end_day)
+    q = Question.objects.create(**options)
+    q.choice_set.create(choice_text='choice1')
+    q.choice_set.create(choice_text='choice2')
+    return q
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    '''Test where the router sends reads and writes'''
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_reads_outside_replica_views_use_primary(self):
+        self.assertEqual('default', self.router.db_for_read(Question))
+
+    def test_polls_reads_use_replica(self):
+        with replica_reads(self.factory.get('/')):
+            self.assertEqual('replica', self.router.db_for_read(Question))
+            self.assertEqual('default', self.router.db_for_read(User))
+            self.assertEqual('default', self.router.db_for_write(Question))
+
+    def test_recent_voter_reads_primary(self):
+        request = self.factory.get('/', HTTP_COOKIE=f'{PRIMARY_COOKIE}=1')
+        with replica_reads(request):
+            self.assertEqual('default', self.router.db_for_read(Question))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        with replica_reads(self.factory.get('/')):
+            self.assertEqual('default', self.router.db_for_read(Question))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    '''
+    Test which database each page reads from, with the 'replica' alias
+    (a test mirror of the primary) standing in for a replica.
+    '''
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        caches['pages'].clear()
+        caches['results'].clear()
+        poll_state.invalidate()
+        self.question = create_question('Replicated question.',
+                                        days=-1, end_day=1)
+        return super().setUp()
+
+    def get(self, url):
+        '''GET url and return (queries on primary, queries on replica)'''
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.client.get(url)
+        return len(primary), len(replica)
+
+    def test_detail_reads_replica(self):
+        poll_state.open_ids()
+        url = reverse('polls:detail', args=(self.question.id,))
+        self.assertEqual((0, 2), self.get(url))
+
+    def test_results_cached_from_primary(self):
+        '''The question comes from a replica, the cached tallies do not'''
+        url = reverse('polls:results', args=(self.question.id,))
+        self.assertEqual((1, 1), self.get(url))
+        self.assertEqual((0, 1), self.get(url))
+
+    def test_index_list_cached_from_primary(self):
+        poll_state.open_ids()
+        primary, replica = self.get(reverse('polls:index'))
+        self.assertEqual(0, replica)
+        self.assertGreater(primary, 0)
+
+    def test_voter_sticks_to_primary(self):
+        '''After voting, the voter's reads go to the primary'''
+        user = User.objects.create_user('voter', password='test')
+        self.client.force_login(user)
+        choice = self.question.choice_set.first()
+        response = self.client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {'choice': choice.id})
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.assertTrue(Vote.objects.filter(user=user).exists())
+        url = reverse('polls:detail', args=(self.question.id,))
+        primary, replica = self.get(url)
+        self.assertEqual(0, replica)
+        self.client.cookies.pop(PRIMARY_COOKIE)
+        primary, replica = self.get(url)
+        self.assertGreater(replica, 0)
@@ -0,0 +1,54 @@
+import os
+import tempfile
+from django.test import SimpleTestCase
+from kupolls.server import cpu_limit, memory_limit, thread_count, worker_count
+
+MB = 2 ** 20
+
+
+class ServerSizingTests(SimpleTestCase):
+    '''Test the worker and thread counts of the production server'''
+    def cgroup(self, files):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, content in files.items():
+            path = os.path.join(directory.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(content + '\n')
+        return directory.name
+
+    def test_workers_follow_cpus_without_memory_limit(self):
+        self.assertEqual(3, worker_count(1))
+        self.assertEqual(17, worker_count(8))
+
+    def test_memory_limit_caps_workers(self):
+        self.assertEqual(3, worker_count(8, 256 * MB, worker_memory=64 * MB,
+                                         base_memory=64 * MB))
+        self.assertEqual(1, worker_count(8, 64 * MB, worker_memory=64 * MB,
+                                         base_memory=64 * MB))
+
+    def test_fewer_workers_get_more_threads(self):
+        self.assertEqual(2, thread_count(8, 17))
+        self.assertEqual(11, thread_count(8, 3))
+        self.assertEqual(16, thread_count(64, 1))
+
+    def test_cgroup_v2_limits(self):
+        cgroup = self.cgroup({'cpu.max': '150000 100000',
+                              'memory.max': str(256 * MB)})
+        self.assertEqual(min(2, len(os.sched_getaffinity(0))),
+                         cpu_limit(cgroup))
+        self.assertEqual(256 * MB, memory_limit(cgroup))
+
+    def test_unlimited_cgroup(self):
+        cgroup = self.cgroup({'cpu.max': 'max 100000',
+                              'memory.max': 'max'})
+        self.assertEqual(len(os.sched_getaffinity(0)), cpu_limit(cgroup))
+        self.assertIsNone(memory_limit(cgroup))
+
+    def test_cgroup_v1_memory_limit(self):
+        self.assertEqual(512 * MB, memory_limit(self.cgroup(
+            {'memory/memory.limit_in_bytes': str(512 * MB)})))
+        self.assertIsNone(memory_limit(self.cgroup(
+            {'memory/memory.limit_in_bytes': str(2 ** 63 - 4096)})))
+        self.assertIsNone(memory_limit(self.cgroup({})))
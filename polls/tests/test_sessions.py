@@ -0,0 +1,93 @@
+import datetime
+from io import StringIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from polls.models import Question
+
+
+def create_question(question_text, days=-1):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with two choices.
+    """
+    q = Question.objects.create(
+        question_text=question_text,
+        pub_date=timezone.now() + datetime.timedelta(days=days))
+    q.choice_set.create(choice_text='choice1')
+    q.choice_set.create(choice_text='choice2')
+    return q
+
+
+@override_settings(VOTE_INGESTION='sync')
+class SessionQueriesTests(TestCase):
+    '''Test the session queries of a logged in voter'''
+    def setUp(self):
+        self.question = create_question('Sessions?')
+        self.choice = self.question.choice_set.first()
+
+    def session_queries(self):
+        self.client.force_login(User.objects.create_user('voter'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('polls:vote', args=(self.question.id,)),
+                {'choice': self.choice.id})
+        self.assertEqual(302, response.status_code)
+        return sum('django_session' in query['sql'] for query in queries)
+
+    def test_db_sessions_are_read_from_the_database(self):
+        with self.settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES['db']):
+            self.assertEqual(1, self.session_queries())
+
+    def test_cached_db_sessions_are_read_from_the_cache(self):
+        with self.settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES['cached_db']):
+            self.assertEqual(0, self.session_queries())
+
+    def test_signed_cookie_sessions(self):
+        with self.settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES['signed_cookies']):
+            self.assertEqual(0, self.session_queries())
+
+    def test_messages_kept_in_a_cookie(self):
+        self.session_queries()
+        self.assertIn('messages', self.client.cookies)
+        response = self.client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'Your vote')
+
+
+class PurgeSessionsTests(TestCase):
+    '''Test the purge_sessions command'''
+    def create_sessions(self, count, days):
+        expire_date = timezone.now() + datetime.timedelta(days=days)
+        Session.objects.bulk_create(
+            Session(session_key=f'{days}-{n}', session_data='',
+                    expire_date=expire_date)
+            for n in range(count))
+
+    def test_deletes_expired_sessions_in_batches(self):
+        self.create_sessions(5, days=-1)
+        self.create_sessions(2, days=1)
+        output = StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=output)
+        self.assertIn('Deleted 5 expired sessions in 3 batches',
+                      output.getvalue())
+        self.assertEqual(2, Session.objects.count())
+        self.assertFalse(Session.objects.filter(
+            expire_date__lt=timezone.now()).exists())
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_nothing_to_purge_for_signed_cookies(self):
+        self.create_sessions(1, days=-1)
+        output = StringIO()
+        call_command('purge_sessions', stdout=output)
+        self.assertIn('nothing to purge', output.getvalue())
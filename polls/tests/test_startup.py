@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+from polls.benchmark import import_times, startup
+from polls.tests.budgets import TIME_FACTOR
+
+IMPORTTIME_OUTPUT = '''\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1864 |     171036 |       django.core.handlers.base
+import time:       663 |       1162 | polls.views
+'''
+
+
+class StartupTests(SimpleTestCase):
+    '''Test the cold start of a server worker'''
+    def test_import_times(self):
+        self.assertEqual({'_io': (120, 120),
+                          'django.core.handlers.base': (1864, 171036),
+                          'polls.views': (663, 1162)},
+                         import_times(IMPORTTIME_OUTPUT))
+
+    def test_within_target(self):
+        seconds, times = startup('kupolls.wsgi', importtime=True)
+        self.assertLess(seconds * 1000,
+                        settings.STARTUP_TARGET_MS * TIME_FACTOR)
+        self.assertIn('polls.views', times)
+        # dev tooling stays out unless DEBUG_TOOLBAR is set
+        self.assertNotIn('debug_toolbar', times)
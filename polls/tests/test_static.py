@@ -0,0 +1,68 @@
+import os
+import tempfile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+from kupolls.storage import StaticFilesStorage
+from polls.metrics import request_metrics
+
+MANIFEST_STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'kupolls.storage.StaticFilesStorage',
+    },
+}
+
+
+class StaticFilesTests(SimpleTestCase):
+    '''Test the collected, hashed and compressed static files'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(
+            STATIC_ROOT=cls.root, STORAGES=MANIFEST_STORAGES,
+            WHITENOISE_AUTOREFRESH=False))
+        # the admin's files only slow the compression down
+        call_command('collectstatic', interactive=False, verbosity=0,
+                     ignore_patterns=['admin'])
+
+    def setUp(self):
+        request_metrics.reset()
+
+    def stylesheet_url(self):
+        return Template("{% load static %}{% static 'polls/style.css' %}") \
+            .render(Context())
+
+    def test_hashed_and_compressed_copies(self):
+        url = self.stylesheet_url()
+        self.assertRegex(url, r'^/static/polls/style\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.root, url.removeprefix('/static/'))
+        for suffix in ('', '.gz', '.br'):
+            self.assertTrue(os.path.exists(path + suffix), path + suffix)
+
+    def test_hashed_name_cached_forever(self):
+        response = self.client.get(self.stylesheet_url(),
+                                   HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('br', response['Content-Encoding'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=315360000', response['Cache-Control'])
+        # answered before MetricsMiddleware and the views
+        self.assertEqual({}, request_metrics.requests)
+
+    def test_unhashed_name_cached_briefly(self):
+        response = self.client.get('/static/polls/style.css')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('max-age=3600, public', response['Cache-Control'])
+
+
+class UncollectedStaticFilesTests(SimpleTestCase):
+    '''Test the static files storage before collectstatic has run'''
+    def test_links_unhashed_names_without_a_manifest(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = StaticFilesStorage(location=root)
+            self.assertEqual('/static/polls/style.css',
+                             storage.url('polls/style.css'))
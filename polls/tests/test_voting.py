@@ -1,9 +1,19 @@
 import datetime
+import threading
+from io import StringIO
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.test import (TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import authenticate
-from polls.models import Question, Vote
+from polls.ingestion import vote_buffer
+from polls.models import Question, Choice, Vote
+from polls.tests.budgets import BudgetTestCase, within_budget
 
 
 def create_question(question_text, days=0, end_day=None,
@@ -62,4 +72,248 @@ class QuestionVoteTest(TestCase):
                                          days=-5, end_day=-1)
         choice = ended_question.choice_set.all()[0]
         self.vote(choice)
-        self.assertEqual(0, choice.votes)
\ No newline at end of file
+        self.assertEqual(0, choice.votes)
+
+
+class VoteTallyTest(TestCase):
+    '''
+    Test that Choice.vote_count follows votes being created, moved,
+    and deleted, and that it can be rebuilt from the Vote table.
+    '''
+    def setUp(self):
+        self.user = User.objects.create_user('Test', password='test')
+        self.question = create_question("present question",
+                                        days=-5, end_day=5)
+        self.choice1, self.choice2 = self.question.choice_set.all()
+        self.client.login(username='Test', password='test')
+        return super().setUp()
+
+    def post_vote(self, choice):
+        return self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                                {'choice': choice.id})
+
+    def test_vote_increments_tally(self):
+        '''Voting through the view adds one to the chosen choice'''
+        self.post_vote(self.choice1)
+        self.choice1.refresh_from_db()
+        self.assertEqual(1, self.choice1.votes)
+
+    def test_changing_vote_moves_tally(self):
+        '''Changing a vote moves it from the old choice to the new one'''
+        self.post_vote(self.choice1)
+        self.post_vote(self.choice2)
+        self.choice1.refresh_from_db()
+        self.choice2.refresh_from_db()
+        self.assertEqual(0, self.choice1.votes)
+        self.assertEqual(1, self.choice2.votes)
+        self.assertEqual(1, Vote.objects.count())
+
+    def test_deleting_vote_decrements_tally(self):
+        '''Deleting a vote, directly or through its user, releases it'''
+        self.post_vote(self.choice1)
+        Vote.objects.get().delete()
+        self.choice1.refresh_from_db()
+        self.assertEqual(0, self.choice1.votes)
+        self.post_vote(self.choice2)
+        self.user.delete()
+        self.choice2.refresh_from_db()
+        self.assertEqual(0, self.choice2.votes)
+
+    def test_rebuild_vote_counts(self):
+        '''rebuild_vote_counts recounts tallies from the Vote table'''
+        self.post_vote(self.choice1)
+        Choice.objects.update(vote_count=42)
+        call_command('rebuild_vote_counts', stdout=StringIO())
+        self.choice1.refresh_from_db()
+        self.choice2.refresh_from_db()
+        self.assertEqual(1, self.choice1.votes)
+        self.assertEqual(0, self.choice2.votes)
+
+    def test_one_vote_per_question(self):
+        '''The database refuses a second vote by a user on a question'''
+        Vote.objects.create(user=self.user, choice=self.choice1)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(user=self.user, choice=self.choice2)
+
+    def test_admin_inline_keeps_tally(self):
+        '''Editing a choice in the admin leaves its tally to the votes'''
+        User.objects.create_superuser('admin', password='test')
+        self.client.login(username='admin', password='test')
+        url = reverse('admin:polls_question_change', args=(self.question.id,))
+        self.post_vote(self.choice1)
+        # the form was loaded before the vote, with the tallies at 0
+        data = {'question_text': self.question.question_text}
+        for field in ('pub_date', 'end_date'):
+            value = timezone.localtime(getattr(self.question, field))
+            data[f'{field}_0'] = value.strftime('%Y-%m-%d')
+            data[f'{field}_1'] = value.strftime('%H:%M:%S')
+        data.update({'choice_set-TOTAL_FORMS': 2,
+                     'choice_set-INITIAL_FORMS': 2})
+        for n, choice in enumerate((self.choice1, self.choice2)):
+            data.update({f'choice_set-{n}-id': choice.id,
+                         f'choice_set-{n}-question': self.question.id,
+                         f'choice_set-{n}-choice_text': f'Edited {n}',
+                         f'choice_set-{n}-vote_count': 0})
+        response = self.client.post(url, data)
+        self.assertEqual(302, response.status_code)
+        self.choice1.refresh_from_db()
+        self.assertEqual('Edited 0', self.choice1.choice_text)
+        self.assertEqual(1, self.choice1.votes)
+
+
+@override_settings(VOTE_INGESTION='queued', VOTE_FLUSH_INTERVAL=0,
+                   VOTE_BATCH_SIZE=100)
+class QueuedVoteTest(TestCase):
+    '''
+    Test the write-behind ingestion mode, where votes are buffered and
+    written in batches.
+    '''
+    def setUp(self):
+        caches['results'].clear()
+        self.user = User.objects.create_user('Test', password='test')
+        self.question = create_question("present question",
+                                        days=-5, end_day=5)
+        self.choice1, self.choice2 = self.question.choice_set.all()
+        self.client.login(username='Test', password='test')
+        return super().setUp()
+
+    def tearDown(self):
+        vote_buffer.flush()
+        return super().tearDown()
+
+    def post_vote(self, choice):
+        return self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                                {'choice': choice.id})
+
+    def test_vote_is_written_on_flush(self):
+        '''A queued vote is written, and tallied, when the buffer flushes'''
+        self.post_vote(self.choice1)
+        self.assertEqual(0, Vote.objects.count())
+        self.assertEqual(1, vote_buffer.flush())
+        self.choice1.refresh_from_db()
+        self.assertEqual(1, self.choice1.votes)
+        self.assertEqual(0, len(vote_buffer))
+
+    def test_flush_moves_existing_vote(self):
+        '''A queued vote replaces the user's written vote'''
+        self.post_vote(self.choice1)
+        vote_buffer.flush()
+        self.post_vote(self.choice2)
+        vote_buffer.flush()
+        self.choice1.refresh_from_db()
+        self.choice2.refresh_from_db()
+        self.assertEqual((0, 1), (self.choice1.votes, self.choice2.votes))
+        self.assertEqual(self.choice2, Vote.objects.get().choice)
+
+    def test_results_show_own_queued_vote(self):
+        '''The voter sees their queued vote on the results page'''
+        self.post_vote(self.choice1)
+        vote_buffer.flush()
+        response = self.post_vote(self.choice2)
+        response = self.client.get(response.url)
+        votes = [row.votes for row in response.context['results']]
+        self.assertEqual([0, 1], votes)
+        self.assertEqual(1, response.context['total_votes'])
+
+    @override_settings(VOTE_BATCH_SIZE=1)
+    def test_full_batch_is_written(self):
+        '''Without a worker, the vote that fills a batch writes it'''
+        self.post_vote(self.choice1)
+        self.assertEqual(1, Vote.objects.count())
+
+    def test_closed_question_is_not_queued(self):
+        '''Votes on closed questions are refused before queueing'''
+        self.question.end_date = timezone.now() - datetime.timedelta(days=1)
+        self.question.save()
+        self.post_vote(self.choice1)
+        self.assertEqual(0, len(vote_buffer))
+
+
+@override_settings(VOTE_INGESTION='queued', VOTE_FLUSH_INTERVAL=0,
+                   VOTE_BATCH_SIZE=100)
+class QueuedVoteIntegrityTest(TransactionTestCase):
+    '''
+    Test a batch holding a vote that can no longer be written. Foreign
+    keys are checked on commit, so the batch has to commit for real.
+    '''
+    def test_only_the_bad_vote_is_dropped(self):
+        question = create_question("present question", days=-5, end_day=5)
+        choice = question.choice_set.first()
+        users = [User.objects.create_user(f'voter{n}') for n in range(3)]
+        for user in users:
+            vote_buffer.add(user, choice)
+        users[1].delete()
+        self.assertEqual(2, vote_buffer.flush())
+        self.assertEqual(0, len(vote_buffer))
+        self.assertEqual({users[0].pk, users[2].pk},
+                         set(Vote.objects.values_list('user', flat=True)))
+        choice.refresh_from_db()
+        self.assertEqual(2, choice.votes)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentVoteTest(TransactionTestCase):
+    '''
+    Cast votes from many threads at once and check that every user ends
+    up with one vote per question and that the tallies match the votes.
+    '''
+    THREADS = 8
+    VOTES_PER_THREAD = 25
+    USERS = 4
+
+    def test_concurrent_votes(self):
+        question = create_question("busy question", days=-1, end_day=1)
+        users = [User.objects.create_user(f'user{n}', password='test')
+                 for n in range(self.USERS)]
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker(n):
+            try:
+                choices = list(question.choice_set.select_related('question'))
+                barrier.wait()
+                for i in range(self.VOTES_PER_THREAD):
+                    user = users[(n + i) % self.USERS]
+                    choice = choices[(n + i // 2) % len(choices)]
+                    with transaction.atomic():
+                        Vote.objects.cast(user, choice)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,))
+                   for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(self.USERS, Vote.objects.count())
+        total = question.choice_set.aggregate(total=Sum('vote_count'))
+        self.assertEqual(self.USERS, total['total'])
+        for choice in question.choice_set.all():
+            self.assertEqual(Vote.objects.filter(choice=choice).count(),
+                             choice.vote_count)
+
+
+class VoteBudgetTests(BudgetTestCase):
+    '''Test the vote view against its budget in budgets.json'''
+    def setUp(self):
+        self.user = User.objects.create_user('budget-voter')
+        self.client.force_login(self.user)
+        return super().setUp()
+
+    @within_budget('polls:vote')
+    def post_vote(self, choice):
+        return self.client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {'choice': choice.id})
+
+    def test_within_budget(self):
+        """A first vote and a changed vote each stay within budget"""
+        first, second = self.question.choice_set.all()[:2]
+        self.post_vote(first)
+        self.post_vote(second)
+        self.assertEqual(second, Vote.objects.get(user=self.user).choice)
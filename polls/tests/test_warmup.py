@@ -0,0 +1,62 @@
+import datetime
+from unittest import mock
+from django.template import engines
+from django.template.loaders.filesystem import Loader as FilesystemLoader
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from polls.models import Question
+from polls.warmup import warm_templates, warm_up
+
+
+def create_question(question_text, days=-1):
+    """
+    Create a question with the given `question_text` published the given
+    number of `days` offset to now, with two choices.
+    """
+    q = Question.objects.create(
+        question_text=question_text,
+        pub_date=timezone.now() + datetime.timedelta(days=days))
+    q.choice_set.create(choice_text='choice1')
+    q.choice_set.create(choice_text='choice2')
+    return q
+
+
+class TemplateWarmupTests(TestCase):
+    '''Test compiling the templates before the first request'''
+    def setUp(self):
+        self.loader = engines['django'].engine.template_loaders[0]
+        self.loader.reset()
+        self.addCleanup(self.loader.reset)
+
+    def test_compiles_polls_registration_and_admin_templates(self):
+        compiled = warm_templates()
+        cached = self.loader.get_template_cache
+        self.assertEqual(compiled, len(cached))
+        for name in ('polls/base_template.html', 'polls/detail.html',
+                     'registration/login.html', 'admin/login.html'):
+            self.assertIn(name, cached)
+        self.assertFalse(any(name.startswith('django/forms/')
+                             for name in cached))
+
+    def test_pages_render_without_compiling(self):
+        question = create_question('Warm?')
+        warm_templates()
+        # the app directories loader reads files through this method too
+        with mock.patch.object(FilesystemLoader, 'get_contents') as read:
+            for url in (reverse('polls:index'),
+                        reverse('polls:results', args=(question.id,)),
+                        reverse('login')):
+                self.assertEqual(200, self.client.get(url).status_code)
+        read.assert_not_called()
+
+    @override_settings(TEMPLATE_WARMUP=False)
+    def test_disabled(self):
+        warm_up()
+        self.assertEqual({}, self.loader.get_template_cache)
+
+    def test_stylesheet_linked_once(self):
+        question = create_question('Styled?')
+        for name in ('polls:detail', 'polls:results'):
+            response = self.client.get(reverse(name, args=(question.id,)))
+            self.assertContains(response, 'polls/style.css', count=1)
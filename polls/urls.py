@@ -1,18 +1,35 @@
 from django.urls import path
 from django.conf import settings
-from debug_toolbar.toolbar import debug_toolbar_urls
-from . import views
+from . import async_views, views
+from .routers import use_replicas
 
 app_name = 'polls'
 
-urlpatterns = [
-    path('', views.IndexView.as_view(), name='index'),
-    path('<int:pk>/', views.DetailView.as_view(), name='detail'),
-    path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
+sync_urlpatterns = [
+    path('', use_replicas(views.IndexView.as_view()), name='index'),
+    path('<int:pk>/', use_replicas(views.DetailView.as_view()),
+         name='detail'),
+    path('<int:pk>/results/', use_replicas(views.ResultsView.as_view()),
+         name='results'),
+    path('<int:pk>/results/stream/', async_views.results_stream,
+         name='results_stream'),
     path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
 ]
 
-if not settings.TESTING:
-    urlpatterns = [
-        *urlpatterns,
-    ] + debug_toolbar_urls()
+# the same URL names, served by the async views
+async_urlpatterns = [
+    path('', use_replicas(async_views.index), name='index'),
+    path('<int:pk>/', use_replicas(async_views.detail), name='detail'),
+    path('<int:pk>/results/', use_replicas(async_views.results),
+         name='results'),
+    path('<int:pk>/results/stream/', async_views.results_stream,
+         name='results_stream'),
+    path('<int:question_id>/vote/', async_views.vote, name='vote'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = async_urlpatterns
+else:
+    urlpatterns = sync_urlpatterns
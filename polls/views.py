@@ -1,15 +1,27 @@
 import logging
-from django.http import HttpResponseRedirect, Http404
+from django.http import (HttpResponse, HttpResponseForbidden,
+                         HttpResponseRedirect, Http404, JsonResponse)
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
 from django.views import generic
+from django.conf import settings
 from django.contrib import messages
 from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
 from django.dispatch import receiver
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login, authenticate
 from .models import Question, Choice, Vote
+from .cache import polls_version, results_cache
+from .ingestion import record_vote, vote_buffer
+from .live import can_stream
+from .metrics import request_metrics
+from .results import with_pending_vote
+from .routers import primary, stick_to_primary
+from .state import poll_state
 from kupolls.settings import LOGOUT_REDIRECT_URL
 
 
@@ -22,10 +34,21 @@ class IndexView(generic.ListView):
     context_object_name = 'questions_list'
 
     def get_queryset(self):
-        questions = Question.objects.all()
-        ids = [q.id for q in questions
-               if (q.is_published() and q.choices_more_than_one())]
-        return Question.objects.filter(id__in=ids).order_by('pub_date')[:5]
+        '''The five oldest published questions that have 2+ choices.'''
+        # the list is cached under the polls version
+        return Question.objects.using(primary(Question)).published() \
+            .with_choices().order_by('pub_date')[:5]
+
+    def get_context_data(self, **kwargs):
+        '''
+        Add the polls version that the template caches the poll list
+        under; the queryset and open_ids are only used when that cache
+        misses.
+        '''
+        context = super().get_context_data(**kwargs)
+        context['polls_version'] = polls_version()
+        context['open_ids'] = SimpleLazyObject(poll_state.open_ids)
+        return context
 
 
 class DetailView(generic.DetailView):
@@ -34,26 +57,30 @@ class DetailView(generic.DetailView):
     template_name = 'polls/detail.html'
 
     def get(self, request, *args, **kwargs):
-        try:
-            question = self.get_object()
-        except Http404:
+        if not poll_state.is_published(self.kwargs['pk']):
             messages.error(request,
                            'The poll you are trying to access \
                            does not exists.')
             return redirect('polls:index')
 
-        if not question.can_vote():
+        if not poll_state.can_vote(self.kwargs['pk']):
             messages.error(request,
                            'The poll you are trying to access \
                            is not in the voting period.')
             return redirect('polls:index')
-        return super().get(request, *args, **kwargs)
+        try:
+            self.object = self.get_object()
+        except Http404:
+            messages.error(request,
+                           'The poll you are trying to access \
+                           does not exists.')
+            return redirect('polls:index')
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
     def get_queryset(self):
         '''Excludes any questions that aren't published yet.'''
-        questions = Question.objects.all()
-        ids = [q.id for q in questions if q.is_published()]
-        return Question.objects.filter(id__in=ids)
+        return Question.objects.published().prefetch_related('choice_set')
 
 
 class ResultsView(generic.DetailView):
@@ -61,6 +88,27 @@ class ResultsView(generic.DetailView):
     model = Question
     template_name = 'polls/results.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        rows, total_votes = results_cache.results(self.object)
+        if settings.VOTE_INGESTION == 'queued':
+            rows, total_votes = self.with_own_vote(rows, total_votes)
+        context['results'], context['total_votes'] = rows, total_votes
+        context['live_results'] = can_stream(self.request)
+        return context
+
+    def with_own_vote(self, rows, total_votes):
+        '''Show the user's own vote even if it is still queued'''
+        user = self.request.user
+        if not user.is_authenticated:
+            return rows, total_votes
+        pending = vote_buffer.pending_choice(user.pk, self.object.pk)
+        if pending is None:
+            return rows, total_votes
+        previous = Vote.objects.filter(user=user, question=self.object) \
+            .values_list('choice', flat=True).first()
+        return with_pending_vote(rows, previous, pending)
+
 
 @login_required
 def vote(request, question_id):
@@ -72,22 +120,39 @@ def vote(request, question_id):
     try:
         selected_choice = question.choice_set.get(pk=request.POST['choice'])
     except (KeyError, Choice.DoesNotExist):
-        logger.error(f"{user.username} did not select a choice.")
+        logger.error("%s did not select a choice.", user.username)
         messages.error(request, "You didn't select a choice.")
         return redirect('polls:detail', question_id)
-    try:
-        vote = Vote.objects.filter(choice__question=question, user=user).get()
-    except (KeyError, Vote.DoesNotExist):
-        vote = Vote.objects.create(choice=selected_choice, user=user)
-        vote.save()
-        logger.info(f"{request.user.username} voted for {selected_choice.choice_text}")
-        return redirect('polls:results', question.id)
+    if record_vote(user, selected_choice):
+        messages.success(request,
+                         f'Your vote for "{selected_choice}" has been recorded.')
+        logger.info("%s voted for %s", user.username,
+                    selected_choice.choice_text)
+        return stick_to_primary(redirect('polls:results', question.id))
+    return redirect('polls:results', question.id)
+
+
+@staff_member_required
+def cache_stats(request):
+    '''Hit and miss counts of this process's results cache'''
+    return JsonResponse(results_cache.stats())
+
+
+def metrics(request):
+    '''
+    Request metrics of this process in the Prometheus text format, for
+    requests bearing METRICS_TOKEN or, without one, for staff.
+    '''
+    if settings.METRICS_TOKEN:
+        allowed = constant_time_compare(
+            request.headers.get('Authorization', ''),
+            f'Bearer {settings.METRICS_TOKEN}')
     else:
-        vote.choice = selected_choice
-        messages.success(request, f'Your vote for "{vote.choice}" has been recorded.')
-        vote.save()
-        logger.info(f"{request.user.username} voted for {selected_choice.choice_text}")
-        return redirect('polls:results', question.id)
+        allowed = request.user.is_active and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(request_metrics.exposition(),
+                        content_type='text/plain; version=0.0.4')
 
 
 def signup(request):
@@ -128,14 +193,18 @@ logger = logging.getLogger(__name__)
 
 @receiver(user_logged_out)
 def user_logged_out_log(sender, request, user, **kwargs):
-    logger.info(f"'{user.username}' logged out from '{get_client_ip(request)}'")
+    logger.info("'%s' logged out from '%s'", user.username,
+                get_client_ip(request))
 
 
 @receiver(user_logged_in)
 def user_logged_in_log(sender, request, user, **kwargs):
-    logger.info(f"{user.username} logged in from {get_client_ip(request)}")
+    logger.info("%s logged in from %s", user.username,
+                get_client_ip(request))
 
 
 @receiver(user_login_failed)
 def user_login_failed_callback(sender, credentials, **kwargs):
-    logger.warning(f"Log in attempt failed for {credentials.get('username', None)} from {get_client_ip(credentials.get('request', None))}")
+    logger.warning("Log in attempt failed for %s from %s",
+                   credentials.get('username', None),
+                   get_client_ip(credentials.get('request', None)))
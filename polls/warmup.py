@@ -0,0 +1,68 @@
+'''
+Compile templates into the cached template loader before the first request.
+
+The cached loader compiles a template the first time it is asked for and
+keeps it for the life of the process, so a fresh process pays for reading
+and compiling each page's templates on its first request to that page.
+warm_up() does this when the application is loaded instead. Under gunicorn
+with preload_app that is in the master, before the workers are forked, so
+every worker starts with the templates compiled.
+'''
+import logging
+import os
+import time
+from django.conf import settings
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PREFIXES = ('polls/', 'registration/', 'admin/')
+
+
+def template_names(loader, prefixes):
+    '''Names of the templates in loader's directories under prefixes'''
+    names = set()
+    for directory in loader.get_dirs():
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                name = os.path.relpath(os.path.join(root, filename),
+                                       directory).replace(os.sep, '/')
+                if name.startswith(prefixes):
+                    names.add(name)
+    return names
+
+
+def warm_templates(prefixes=WARMUP_PREFIXES):
+    '''
+    Compile every template whose name starts with one of prefixes into the
+    cached loaders of the Django template engines. Return how many were
+    compiled.
+    '''
+    compiled = 0
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for loader in engine.template_loaders:
+            if not isinstance(loader, CachedLoader):
+                continue
+            names = set()
+            for inner in loader.loaders:
+                names |= template_names(inner, prefixes)
+            for name in sorted(names):
+                # the same lookup a request makes, so the first loader to
+                # find a name wins, as it would then
+                engine.get_template(name)
+                compiled += 1
+    return compiled
+
+
+def warm_up():
+    '''Compile the templates if TEMPLATE_WARMUP is set'''
+    if not settings.TEMPLATE_WARMUP:
+        return
+    start = time.perf_counter()
+    compiled = warm_templates()
+    logger.info('Compiled %d templates in %.0f ms', compiled,
+                (time.perf_counter() - start) * 1000)